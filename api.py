@@ -1,6 +1,7 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import Literal, Optional
 import asyncio
 import os
 import json
@@ -9,14 +10,76 @@ import uuid
 from pathlib import Path
 
 # Import the existing join_meet function
-from gmeet import join_meet
+from gmeet import MeetConfig, join_meet, resume_meeting, setup_virtual_audio
+from checkpoints import CHECKPOINT_FILE, Checkpoint
+from gladia import close_client, resolve_callback
+from scheduler import RecordingSlot, SlotScheduler
+from browser_pool import BrowserPool
+from metrics import JOB_FAILURES, JOBS_QUEUED, JOBS_RUNNING, render
+from tracing import TRACE_FILE, read_trace
+from waits import StepTimeout
+from job_events import JOB_EVENTS_KEEPALIVE_SECONDS, JobEvents, format_event
+from downloads import RangeFileResponse, transcript_response
+from transcript_formats import (
+    TRANSCRIPT_FILE,
+    read_utterances,
+    remove_transcript_files,
+    write_transcript_formats,
+)
+from transcript_index import SEARCH_MAX_PAGE_SIZE, SEARCH_PAGE_SIZE, TranscriptIndex
+from recording import ENCODING_PROFILES
+from job_store import (
+    IN_FLIGHT_STATUSES,
+    JOB_MAX_PAGE_SIZE,
+    JOB_PAGE_SIZE,
+    JobStore,
+    decode_cursor,
+    project,
+)
 
 app = FastAPI(title="Google Meet Bot API", description="API to control Google Meet recording bot")
 
-# Store for tracking job status
-jobs = {}
-# Store for running processes
+# Store for tracking job status, shared by all workers
+job_store = JobStore()
+# Store for the recording tasks running in this worker
 running_processes = {}
+# Periodic tasks started with the app
+periodic_tasks = []
+# Live events of the jobs running in this worker, see /job/{job_id}/events
+job_events = JobEvents()
+# Full-text index of the utterances of every transcribed job, see /search
+transcript_index = TranscriptIndex()
+
+def update_job(job_id, **fields):
+    """
+    Change some fields of a job and push the updated job to its followers
+    """
+    job = job_store.update(job_id, **fields)
+    if job is not None:
+        job_events.publish(job_id, "job", job)
+    return job
+
+def update_queue_positions(waiting_job_ids):
+    """
+    Refresh the queue position of every job waiting for a recording slot
+    """
+    updated = job_store.update_many(
+        {
+            job_id: {"queue_position": position}
+            for position, job_id in enumerate(waiting_job_ids, 1)
+        }
+    )
+    for job_id, job in updated.items():
+        if job is not None:
+            job_events.publish(job_id, "job", job)
+
+# Fixed pool of recording slots, each with its own display and audio sink
+scheduler = SlotScheduler(on_queue_change=update_queue_positions)
+# Idle signed-in browsers kept on the slots between jobs
+browser_pool = BrowserPool(scheduler.slots)
+
+JOBS_RUNNING.set_function(lambda: scheduler.total_slots - scheduler.free_slots)
+JOBS_QUEUED.set_function(lambda: scheduler.queued)
 
 class MeetRequest(BaseModel):
     meet_link: str
@@ -27,6 +90,14 @@ class MeetRequest(BaseModel):
     gladia_api_key: str
     diarization: bool = False
     custom_name: Optional[str] = None
+    streaming_transcription: bool = False
+    priority: int = 0
+    # audio: no video capture, low_fps: 2 fps video, full: 1080p30 video
+    recording_mode: Literal["audio", "low_fps", "full"] = "full"
+    # video settings of full recordings: quality, balanced or economy
+    encoding_profile: Optional[str] = None
+    # stop early when the meeting ends, the bot is alone or it stays silent
+    stop_on_meeting_end: bool = True
 
 class JobStatus(BaseModel):
     job_id: str
@@ -35,8 +106,35 @@ class JobStatus(BaseModel):
     created_at: str
     completed_at: Optional[str] = None
     video_path: Optional[str] = None
+    audio_path: Optional[str] = None
     transcript_path: Optional[str] = None
     duration_seconds: Optional[int] = None
+    upload_progress: Optional[float] = None
+    time_to_join_seconds: Optional[float] = None
+    queue_position: Optional[int] = None
+
+@app.on_event("startup")
+async def startup():
+    # jobs left in flight by a worker that no longer runs will never finish
+    orphaned = job_store.mark_orphaned()
+    if orphaned:
+        print(f"Marked {len(orphaned)} interrupted jobs as failed")
+    # old jobs are deleted in the background, not on each request
+    periodic_tasks.append(
+        asyncio.create_task(job_store.expire_periodically(forget_expired_jobs))
+    )
+    browser_pool.schedule_fill()
+    # transcripts written before the index existed
+    periodic_tasks.append(asyncio.create_task(asyncio.to_thread(backfill_transcript_index)))
+
+@app.on_event("shutdown")
+async def shutdown():
+    for task in periodic_tasks:
+        task.cancel()
+    await browser_pool.close()
+    await close_client()
+    job_store.close()
+    transcript_index.close()
 
 @app.get("/")
 async def root():
@@ -46,33 +144,44 @@ async def root():
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Prometheus metrics: phase latencies, failures, slots and resources
+    """
+    body, content_type = render()
+    return Response(content=body, media_type=content_type)
+
 @app.get("/stats")
 async def get_stats():
     """
     Get API statistics
     """
-    clean_old_jobs()  # Clean before stats
-    
-    total_jobs = len(jobs)
-    running_jobs = len([j for j in jobs.values() if j.status == "running"])
-    completed_jobs = len([j for j in jobs.values() if j.status == "completed"])
-    failed_jobs = len([j for j in jobs.values() if j.status == "failed"])
+    counts = job_store.count_by_status()
+    total_jobs = sum(counts.values())
+    running_jobs = counts.get("running", 0)
+    completed_jobs = counts.get("completed", 0)
+    failed_jobs = counts.get("failed", 0)
+    queued_jobs = counts.get("queued", 0)
     
     # Calculate average duration
-    durations = [j.duration_seconds for j in jobs.values() if j.duration_seconds]
-    avg_duration = sum(durations) / len(durations) if durations else 0
+    avg_duration = job_store.average_duration()
     
     return {
         "total_jobs": total_jobs,
         "running_jobs": running_jobs,
         "completed_jobs": completed_jobs,
         "failed_jobs": failed_jobs,
+        "queued_jobs": queued_jobs,
+        "total_slots": scheduler.total_slots,
+        "free_slots": scheduler.free_slots,
+        "warm_browsers": browser_pool.idle_count,
         "average_duration_seconds": round(avg_duration, 2),
         "uptime": datetime.now().isoformat()
     }
 
 @app.post("/start-recording", response_model=JobStatus)
-async def start_recording(request: MeetRequest, background_tasks: BackgroundTasks):
+async def start_recording(request: MeetRequest):
     """
     Start a Google Meet recording session
     """
@@ -81,6 +190,8 @@ async def start_recording(request: MeetRequest, background_tasks: BackgroundTask
     # Validate required fields
     if not request.meet_link or not request.email or not request.password or not request.gladia_api_key:
         raise HTTPException(status_code=400, detail="Missing required fields")
+    if request.encoding_profile and request.encoding_profile not in ENCODING_PROFILES:
+        raise HTTPException(status_code=400, detail="Unknown encoding profile")
     
     # Create job status
     job_status = JobStatus(
@@ -90,26 +201,14 @@ async def start_recording(request: MeetRequest, background_tasks: BackgroundTask
         created_at=datetime.now().isoformat()
     )
     
-    jobs[job_id] = job_status
-    
-    # Set environment variables for the bot
-    os.environ["GMEET_LINK"] = request.meet_link
-    os.environ["GMAIL_USER_EMAIL"] = request.email
-    os.environ["GMAIL_USER_PASSWORD"] = request.password
-    os.environ["DURATION_IN_MINUTES"] = str(request.duration_minutes)
-    os.environ["MAX_WAITING_TIME_IN_MINUTES"] = str(request.max_wait_time_minutes)
-    os.environ["GLADIA_API_KEY"] = request.gladia_api_key
-    os.environ["DIARIZATION"] = str(request.diarization).lower()
-    
-    if request.custom_name:
-        os.environ["CUSTOM_NAME"] = request.custom_name
+    job_store.create(job_status.dict())
+    job_events.open(job_id)
     
     # Create recordings directory if it doesn't exist
     Path("recordings").mkdir(exist_ok=True)
-    Path("screenshots").mkdir(exist_ok=True)
     
     # Start the recording process in background
-    task = background_tasks.add_task(run_recording_job, job_id, request)
+    task = asyncio.create_task(run_recording_job(job_id, request))
     running_processes[job_id] = task
     
     return job_status
@@ -119,50 +218,235 @@ async def get_job_status(job_id: str):
     """
     Get the status of a recording job
     """
-    if job_id not in jobs:
+    job = job_store.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    return jobs[job_id]
+    return job
 
-@app.get("/jobs")
-async def list_jobs():
+@app.get("/job/{job_id}/trace")
+async def get_job_trace(job_id: str):
     """
-    List all jobs and clean old ones
+    Timed spans of a job's steps, ordered by start time
     """
-    # Clean old completed jobs (older than 24 hours)
-    clean_old_jobs()
-    return {"jobs": list(jobs.values())}
+    if job_store.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
 
-def clean_old_jobs():
+    spans = read_trace(os.path.join("recordings", job_id, TRACE_FILE))
+    if spans is None:
+        raise HTTPException(status_code=404, detail="No trace for this job yet")
+    return {"job_id": job_id, "spans": spans}
+
+@app.get("/job/{job_id}/events")
+async def get_job_events(job_id: str, request: Request):
     """
-    Remove jobs older than 24 hours
+    Server-Sent Events stream of a job: the job on every change, stage
+    starts and ends, join attempts, recording time, upload progress and
+    transcription polls, until the job ends
     """
-    cutoff_time = datetime.now() - timedelta(hours=24)
-    jobs_to_remove = []
-    
-    for job_id, job in jobs.items():
-        if job.completed_at:
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    try:
+        last_event_id = int(request.headers.get("last-event-id"))
+    except (TypeError, ValueError):
+        last_event_id = None
+
+    return StreamingResponse(
+        stream_job_events(job_id, job, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def job_finished(job):
+    return job["status"] not in IN_FLIGHT_STATUSES and job.get("completed_at")
+
+async def stream_job_events(job_id, job, last_event_id=None):
+    queue = job_events.subscribe(job_id, last_event_id)
+    try:
+        yield format_event({"event": "job", "data": job})
+        if job_finished(job):
+            return
+        while True:
             try:
-                completed_time = datetime.fromisoformat(job.completed_at)
-                if completed_time < cutoff_time:
-                    jobs_to_remove.append(job_id)
-            except:
-                pass
-    
-    for job_id in jobs_to_remove:
-        del jobs[job_id]
-        if job_id in running_processes:
-            del running_processes[job_id]
-    
-    if jobs_to_remove:
-        print(f"Cleaned {len(jobs_to_remove)} old jobs")
+                message = await asyncio.wait_for(
+                    queue.get(), JOB_EVENTS_KEEPALIVE_SECONDS
+                )
+            except asyncio.TimeoutError:
+                # the job may run on another worker, whose events don't
+                # reach this one: fall back to the shared store
+                current = job_store.get(job_id)
+                if current is None:
+                    return
+                if current != job:
+                    job = current
+                    yield format_event({"event": "job", "data": job})
+                    if job_finished(job):
+                        return
+                else:
+                    yield ": keep-alive\n\n"
+                continue
+
+            yield format_event(message)
+            if message["event"] == "job":
+                job = message["data"]
+            elif message["event"] == "end":
+                return
+    finally:
+        job_events.unsubscribe(job_id, queue)
+
+@app.api_route("/job/{job_id}/recording", methods=["GET", "HEAD"])
+async def download_recording(job_id: str, request: Request):
+    """
+    Download the recording of a job, with Range and ETag support
+    """
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    path = job.get("video_path") or job.get("audio_path")
+    if not path or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Recording not available")
+    return RangeFileResponse(path, request, filename=f"{job_id}{Path(path).suffix}")
+
+@app.api_route("/job/{job_id}/transcript", methods=["GET", "HEAD"])
+async def download_transcript(job_id: str, request: Request):
+    """
+    Download the transcript of a job, gzip-compressed if accepted
+    """
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    path = job.get("transcript_path")
+    if not path or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Transcript not available")
+    return await transcript_response(
+        path, request, filename=f"{job_id}_transcript{Path(path).suffix}"
+    )
+
+@app.get("/search")
+async def search_transcripts(
+    q: str = Query(..., min_length=1),
+    job_id: Optional[str] = None,
+    speaker: Optional[str] = None,
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=SEARCH_MAX_PAGE_SIZE),
+):
+    """
+    Search the utterances of every transcribed job; hits carry the job,
+    speaker and timestamps, best match first
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Empty query")
+    hits = await asyncio.to_thread(
+        transcript_index.search, q, job_id=job_id, speaker=speaker, limit=limit
+    )
+    return {"query": q, "hits": hits}
+
+@app.get("/jobs")
+async def list_jobs(
+    status: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(JOB_PAGE_SIZE, ge=1, le=JOB_MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
+    """
+    List jobs, newest first, one page at a time.
+
+    status takes a comma-separated list of statuses, fields the
+    comma-separated fields to return, and format=ndjson streams every
+    matching job as one JSON object per line instead of a page.
+    """
+    filters = {
+        "statuses": status.split(",") if status else None,
+        "created_after": created_after.isoformat() if created_after else None,
+        "created_before": created_before.isoformat() if created_before else None,
+        "cursor": cursor,
+    }
+    selected_fields = fields.split(",") if fields else None
+
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    if format == "ndjson":
+        lines = (
+            json.dumps(project(job, selected_fields)) + "\n"
+            for job in job_store.iter_jobs(**filters)
+        )
+        return StreamingResponse(lines, media_type="application/x-ndjson")
+
+    jobs, next_cursor = job_store.page(limit=limit, **filters)
+    return {
+        "jobs": [project(job, selected_fields) for job in jobs],
+        "next_cursor": next_cursor,
+    }
+
+@app.post("/gladia/callback")
+async def gladia_callback(request: Request, token: str = ""):
+    """
+    Receive Gladia transcription completion callbacks, authenticated by the
+    secret token of their callback URL
+    """
+    payload = await request.json()
+    if not resolve_callback(token, payload):
+        raise HTTPException(status_code=404, detail="Unknown callback")
+    return {"received": payload.get("id") or payload.get("request_id")}
+
+def forget_expired_jobs(job_ids):
+    """
+    Drop the tasks and indexed transcripts of jobs removed by the expiry task
+    """
+    for job_id in job_ids:
+        running_processes.pop(job_id, None)
+        transcript_index.remove(job_id)
+
+@app.post("/job/{job_id}/retry", response_model=JobStatus)
+async def retry_job(job_id: str):
+    """
+    Resume a failed or interrupted job from its last completed stage, e.g.
+    upload or transcription, without recording the meeting again
+    """
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == "completed":
+        raise HTTPException(status_code=409, detail="Job already completed")
+
+    checkpoint = Checkpoint(os.path.join("recordings", job_id, CHECKPOINT_FILE))
+    if not checkpoint.reached("recorded"):
+        raise HTTPException(
+            status_code=409, detail="The meeting was not recorded, nothing to resume"
+        )
+
+    # a job in flight on a live worker can't be taken over
+    job = job_store.claim(
+        job_id,
+        status="running",
+        message=f"Resuming after stage {checkpoint.stage}...",
+        completed_at=None,
+        duration_seconds=None,
+        upload_progress=None,
+    )
+    if job is None:
+        raise HTTPException(status_code=409, detail="Job is still running")
+    job_events.open(job_id)
+    job_events.publish(job_id, "job", job)
+
+    config = MeetConfig.from_checkpoint(checkpoint)
+    task = asyncio.create_task(run_resume_job(job_id, config))
+    running_processes[job_id] = task
+    return job
 
 @app.delete("/job/{job_id}")
 async def delete_job(job_id: str):
     """
-    Delete a job and stop running process if any
+    Delete a job and its transcripts, and stop running process if any
     """
-    if job_id not in jobs:
+    if job_store.get(job_id) is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
     # Stop running process if exists
@@ -171,68 +455,258 @@ async def delete_job(job_id: str):
             process = running_processes[job_id]
             if process and not process.done():
                 process.cancel()
-                jobs[job_id].status = "cancelled"
-                jobs[job_id].message = "Job cancelled by user"
         except Exception as e:
             print(f"Error cancelling job {job_id}: {e}")
         finally:
             del running_processes[job_id]
     
-    del jobs[job_id]
+    job_store.delete(job_id)
+    transcript_index.remove(job_id)
+    remove_transcript_files(os.path.join("recordings", job_id))
+    job_events.publish(job_id, "end", {"deleted": True})
+    job_events.forget(job_id)
     return {"message": "Job deleted and stopped"}
 
+def build_config(job_id: str, request: MeetRequest, slot: RecordingSlot) -> MeetConfig:
+    """
+    Build the recording config of a job from its request and slot
+    """
+    return MeetConfig.for_job(
+        job_id,
+        meet_link=request.meet_link,
+        email=request.email,
+        password=request.password,
+        gladia_api_key=request.gladia_api_key,
+        duration_minutes=request.duration_minutes,
+        max_wait_time_minutes=request.max_wait_time_minutes,
+        diarization=request.diarization,
+        custom_name=request.custom_name or "TEST",
+        streaming_transcription=request.streaming_transcription,
+        recording_mode=request.recording_mode,
+        encoding_profile=request.encoding_profile,
+        stop_on_meeting_end=request.stop_on_meeting_end,
+        display=slot.display,
+        audio_sink=slot.audio_sink,
+    )
+
 async def run_recording_job(job_id: str, request: MeetRequest):
     """
     Background task to run the recording job
     """
+    slot = None
     try:
+        # Wait for a free recording slot
+        update_job(
+            job_id, status="queued", message="Waiting for a recording slot..."
+        )
+        slot = await scheduler.acquire(
+            job_id,
+            request.priority,
+            prefer=lambda slot: browser_pool.has_idle(slot.display, request.email),
+        )
+
         # Update job status
-        jobs[job_id].status = "running"
-        jobs[job_id].message = "Joining Google Meet..."
+        update_job(
+            job_id,
+            status="running",
+            message="Joining Google Meet...",
+            queue_position=None,
+        )
+
+        setup_virtual_audio()
+        await asyncio.to_thread(slot.prepare)
         
         # Calculate total timeout (recording + transcription + buffer)
         total_timeout = (request.duration_minutes + 10) * 60  # +10 minutes buffer
         
+        def report_joined(time_to_join):
+            update_job(
+                job_id,
+                time_to_join_seconds=round(time_to_join, 1),
+                message="Recording meeting...",
+            )
+
+        # Each job gets its own config and recordings/<job_id> workspace
+        config = build_config(job_id, request, slot)
+
         # Run the join_meet function with timeout
         try:
-            await asyncio.wait_for(join_meet(), timeout=total_timeout)
+            await asyncio.wait_for(
+                join_meet(
+                    config,
+                    progress_callback=upload_progress_reporter(job_id),
+                    joined_callback=report_joined,
+                    browser_pool=browser_pool,
+                    listener=trace_listener(job_id),
+                ),
+                timeout=total_timeout,
+            )
         except asyncio.TimeoutError:
-            jobs[job_id].status = "failed"
-            jobs[job_id].message = f"Job timed out after {total_timeout//60} minutes"
+            JOB_FAILURES.labels("timeout").inc()
+            update_job(
+                job_id,
+                status="failed",
+                message=f"Job timed out after {total_timeout//60} minutes",
+            )
             return
         
-        # Check if files were created
-        video_path = "recordings/output.mp4"
-        transcript_path = "recordings/transcript.json"
-        
-        if os.path.exists(video_path) and os.path.exists(transcript_path):
-            jobs[job_id].status = "completed"
-            jobs[job_id].message = "Recording completed successfully"
-            jobs[job_id].video_path = video_path
-            jobs[job_id].transcript_path = transcript_path
-        else:
-            jobs[job_id].status = "failed"
-            jobs[job_id].message = "Recording failed - files not found"
+        report_outcome(job_id, config)
+        await index_transcript(job_id, config)
             
+    except StepTimeout as e:
+        # a page element never showed up, not the job running out of time
+        JOB_FAILURES.labels("step_timeout").inc()
+        update_job(job_id, status="failed", message=f"Recording failed: {str(e)}")
+
     except Exception as e:
-        jobs[job_id].status = "failed"
-        jobs[job_id].message = f"Recording failed: {str(e)}"
+        JOB_FAILURES.labels(type(e).__name__).inc()
+        update_job(job_id, status="failed", message=f"Recording failed: {str(e)}")
     
     finally:
-        jobs[job_id].completed_at = datetime.now().isoformat()
-        
+        if slot is not None:
+            scheduler.release(slot)
+        finalize_job(job_id)
+
+async def run_resume_job(job_id: str, config: MeetConfig):
+    """
+    Background task finishing a job from its checkpoint
+    """
+    try:
+        await resume_meeting(
+            config,
+            progress_callback=upload_progress_reporter(job_id),
+            listener=trace_listener(job_id),
+        )
+        report_outcome(job_id, config)
+        await index_transcript(job_id, config)
+    except Exception as e:
+        JOB_FAILURES.labels(type(e).__name__).inc()
+        update_job(job_id, status="failed", message=f"Retry failed: {str(e)}")
+    finally:
+        finalize_job(job_id)
+
+def trace_listener(job_id: str):
+    """
+    Trace listener pushing a job's stages, events and progress to its followers
+    """
+    def publish(name, attributes):
+        job_events.publish(job_id, name, attributes)
+
+    return publish
+
+def upload_progress_reporter(job_id: str):
+    """
+    Upload progress callback storing the progress of a job
+    """
+    reported_percent = None
+
+    def report_upload_progress(sent, total):
+        nonlocal reported_percent
+        progress = round(sent * 100 / total, 1) if total else 100.0
+        # one store write per percent, not per uploaded chunk
+        if int(progress) == reported_percent:
+            return
+        reported_percent = int(progress)
+        update_job(
+            job_id,
+            upload_progress=progress,
+            message=f"Uploading recording to Gladia ({progress}%)",
+        )
+
+    return report_upload_progress
+
+async def index_transcript(job_id: str, config: MeetConfig):
+    """
+    Add the utterances of a finished job to the search index
+    """
+    utterances = read_utterances(config.output_dir)
+    if utterances is None:
+        return
+    try:
+        await asyncio.to_thread(transcript_index.add, job_id, utterances)
+    except Exception as e:
+        # the job itself succeeded
+        print(f"Could not index the transcript of {job_id}: {e!r}")
+
+def backfill_transcript_index(recordings_dir="recordings"):
+    """
+    Convert and index the transcripts of known jobs missing from the index
+    """
+    indexed = transcript_index.job_ids()
+    try:
+        job_ids = os.listdir(recordings_dir)
+    except OSError:
+        return
+    for job_id in job_ids:
+        output_dir = os.path.join(recordings_dir, job_id)
+        transcript_path = os.path.join(output_dir, TRANSCRIPT_FILE)
+        if job_id in indexed or not os.path.isfile(transcript_path):
+            continue
+        # leftovers of deleted or expired jobs stay out of search results
+        if job_store.get(job_id) is None:
+            continue
+        utterances = read_utterances(output_dir)
+        if utterances is None:
+            try:
+                with open(transcript_path) as f:
+                    response = json.load(f)
+                utterances = write_transcript_formats(output_dir, response)
+            except (OSError, ValueError) as e:
+                print(f"Could not convert {transcript_path}: {e!r}")
+                continue
+        transcript_index.add(job_id, utterances)
+
+def report_outcome(job_id: str, config: MeetConfig):
+    """
+    Mark a job completed or failed from the files its run left
+    """
+    recording_path = config.recording_path
+    transcript_path = config.transcript_path
+
+    if os.path.exists(recording_path) and os.path.exists(transcript_path):
+        recording_field = "audio_path" if config.recording_mode == "audio" else "video_path"
+        update_job(
+            job_id,
+            status="completed",
+            message="Recording completed successfully",
+            transcript_path=transcript_path,
+            **{recording_field: recording_path},
+        )
+    else:
+        if not os.path.exists(recording_path):
+            JOB_FAILURES.labels("no_recording").inc()
+        elif os.path.exists(config.error_path):
+            JOB_FAILURES.labels("transcription_error").inc()
+        else:
+            JOB_FAILURES.labels("no_transcript").inc()
+        update_job(
+            job_id, status="failed", message="Recording failed - files not found"
+        )
+
+def finalize_job(job_id: str):
+    """
+    Record when a job ended and forget its task
+    """
+    # The job may have been deleted while running
+    job = job_store.get(job_id)
+    if job is not None:
+        completed_at = datetime.now().isoformat()
+        fields = {"completed_at": completed_at}
+
         # Calculate duration
         try:
-            created_time = datetime.fromisoformat(jobs[job_id].created_at)
-            completed_time = datetime.fromisoformat(jobs[job_id].completed_at)
-            duration = int((completed_time - created_time).total_seconds())
-            jobs[job_id].duration_seconds = duration
+            created_time = datetime.fromisoformat(job["created_at"])
+            completed_time = datetime.fromisoformat(completed_at)
+            fields["duration_seconds"] = int((completed_time - created_time).total_seconds())
         except:
             pass
-        
-        # Clean up running process
-        if job_id in running_processes:
-            del running_processes[job_id]
+        update_job(job_id, **fields)
+    job_events.publish(job_id, "end", {"status": job["status"] if job else None})
+    job_events.forget(job_id)
+    
+    # Clean up running process
+    if job_id in running_processes:
+        del running_processes[job_id]
 
 if __name__ == "__main__":
     import uvicorn
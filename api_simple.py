@@ -1,4 +1,5 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Query, BackgroundTasks, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
 import asyncio
@@ -8,10 +9,21 @@ from datetime import datetime, timedelta
 import uuid
 from pathlib import Path
 
+from downloads import RangeFileResponse, transcript_response
+from job_store import (
+    JOB_MAX_PAGE_SIZE,
+    JOB_PAGE_SIZE,
+    JobStore,
+    decode_cursor,
+    project,
+)
+
 app = FastAPI(title="Google Meet Bot API", description="API to control Google Meet recording bot")
 
-# Store for tracking job status
-jobs = {}
+# Store for tracking job status, shared by all workers
+job_store = JobStore()
+# Periodic tasks started with the app
+periodic_tasks = []
 
 class MeetRequest(BaseModel):
     meet_link: str
@@ -33,6 +45,19 @@ class JobStatus(BaseModel):
     transcript_path: Optional[str] = None
     duration_seconds: Optional[int] = None
 
+@app.on_event("startup")
+async def startup():
+    # jobs left in flight by a worker that no longer runs will never finish
+    job_store.mark_orphaned()
+    # old jobs are deleted in the background, not on each request
+    periodic_tasks.append(asyncio.create_task(job_store.expire_periodically()))
+
+@app.on_event("shutdown")
+async def shutdown():
+    for task in periodic_tasks:
+        task.cancel()
+    job_store.close()
+
 @app.get("/")
 async def root():
     return {"message": "Google Meet Bot API is running"}
@@ -46,16 +71,14 @@ async def get_stats():
     """
     Get API statistics
     """
-    clean_old_jobs()  # Clean before stats
-    
-    total_jobs = len(jobs)
-    running_jobs = len([j for j in jobs.values() if j.status == "running"])
-    completed_jobs = len([j for j in jobs.values() if j.status == "completed"])
-    failed_jobs = len([j for j in jobs.values() if j.status == "failed"])
+    counts = job_store.count_by_status()
+    total_jobs = sum(counts.values())
+    running_jobs = counts.get("running", 0)
+    completed_jobs = counts.get("completed", 0)
+    failed_jobs = counts.get("failed", 0)
     
     # Calculate average duration
-    durations = [j.duration_seconds for j in jobs.values() if j.duration_seconds]
-    avg_duration = sum(durations) / len(durations) if durations else 0
+    avg_duration = job_store.average_duration()
     
     return {
         "total_jobs": total_jobs,
@@ -85,7 +108,7 @@ async def start_recording(request: MeetRequest, background_tasks: BackgroundTask
         created_at=datetime.now().isoformat()
     )
     
-    jobs[job_id] = job_status
+    job_store.create(job_status.dict())
     
     # Add background task
     background_tasks.add_task(run_recording_job, job_id, request)
@@ -97,63 +120,108 @@ async def get_job_status(job_id: str):
     """
     Get the status of a specific recording job
     """
-    if job_id not in jobs:
+    job = job_store.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    return jobs[job_id]
+    return job
 
-@app.get("/jobs")
-async def list_jobs():
+@app.api_route("/job/{job_id}/recording", methods=["GET", "HEAD"])
+async def download_recording(job_id: str, request: Request):
     """
-    Get a list of all recording jobs
+    Download the recording of a job, with Range and ETag support
     """
-    clean_old_jobs()
-    return list(jobs.values())
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    path = job.get("video_path") or job.get("audio_path")
+    if not path or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Recording not available")
+    return RangeFileResponse(path, request, filename=f"{job_id}{Path(path).suffix}")
 
-def clean_old_jobs():
+@app.api_route("/job/{job_id}/transcript", methods=["GET", "HEAD"])
+async def download_transcript(job_id: str, request: Request):
     """
-    Clean up old completed jobs (older than 24 hours)
+    Download the transcript of a job, gzip-compressed if accepted
     """
-    cutoff_time = datetime.now() - timedelta(hours=24)
-    jobs_to_remove = []
-    
-    for job_id, job in jobs.items():
-        if job.status in ["completed", "failed"] and job.created_at:
-            try:
-                created_time = datetime.fromisoformat(job.created_at.replace('Z', '+00:00'))
-                if created_time < cutoff_time:
-                    jobs_to_remove.append(job_id)
-            except:
-                pass
-    
-    for job_id in jobs_to_remove:
-        del jobs[job_id]
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    path = job.get("transcript_path")
+    if not path or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Transcript not available")
+    return await transcript_response(
+        path, request, filename=f"{job_id}_transcript{Path(path).suffix}"
+    )
+
+@app.get("/jobs")
+async def list_jobs(
+    status: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(JOB_PAGE_SIZE, ge=1, le=JOB_MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
+    """
+    List jobs, newest first, one page at a time.
+
+    status takes a comma-separated list of statuses, fields the
+    comma-separated fields to return, and format=ndjson streams every
+    matching job as one JSON object per line instead of a page.
+    """
+    filters = {
+        "statuses": status.split(",") if status else None,
+        "created_after": created_after.isoformat() if created_after else None,
+        "created_before": created_before.isoformat() if created_before else None,
+        "cursor": cursor,
+    }
+    selected_fields = fields.split(",") if fields else None
+
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    if format == "ndjson":
+        lines = (
+            json.dumps(project(job, selected_fields)) + "\n"
+            for job in job_store.iter_jobs(**filters)
+        )
+        return StreamingResponse(lines, media_type="application/x-ndjson")
+
+    jobs, next_cursor = job_store.page(limit=limit, **filters)
+    return {
+        "jobs": [project(job, selected_fields) for job in jobs],
+        "next_cursor": next_cursor,
+    }
 
 @app.delete("/job/{job_id}")
 async def delete_job(job_id: str):
     """
     Delete a specific job and its associated files
     """
-    if job_id not in jobs:
+    job = job_store.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = jobs[job_id]
-    
     # Delete associated files if they exist
-    if job.video_path and os.path.exists(job.video_path):
+    if job["video_path"] and os.path.exists(job["video_path"]):
         try:
-            os.remove(job.video_path)
+            os.remove(job["video_path"])
         except:
             pass
     
-    if job.transcript_path and os.path.exists(job.transcript_path):
+    if job["transcript_path"] and os.path.exists(job["transcript_path"]):
         try:
-            os.remove(job.transcript_path)
+            os.remove(job["transcript_path"])
         except:
             pass
     
     # Remove job from store
-    del jobs[job_id]
+    job_store.delete(job_id)
     
     return {"message": "Job deleted successfully"}
 
@@ -163,25 +231,30 @@ async def run_recording_job(job_id: str, request: MeetRequest):
     """
     try:
         # Update job status to running
-        jobs[job_id].status = "running"
-        jobs[job_id].message = "Joining Google Meet..."
+        job_store.update(job_id, status="running", message="Joining Google Meet...")
         
         # Simulate some work (replace with actual recording logic)
         await asyncio.sleep(2)
         
         # Update job status to completed
-        jobs[job_id].status = "completed"
-        jobs[job_id].message = "Recording completed successfully"
-        jobs[job_id].completed_at = datetime.now().isoformat()
-        jobs[job_id].duration_seconds = request.duration_minutes * 60
-        jobs[job_id].video_path = f"/app/recordings/recording_{job_id}.mp4"
-        jobs[job_id].transcript_path = f"/app/recordings/transcript_{job_id}.txt"
+        job_store.update(
+            job_id,
+            status="completed",
+            message="Recording completed successfully",
+            completed_at=datetime.now().isoformat(),
+            duration_seconds=request.duration_minutes * 60,
+            video_path=f"/app/recordings/recording_{job_id}.mp4",
+            transcript_path=f"/app/recordings/transcript_{job_id}.txt",
+        )
         
     except Exception as e:
         # Update job status to failed
-        jobs[job_id].status = "failed"
-        jobs[job_id].message = f"Recording failed: {str(e)}"
-        jobs[job_id].completed_at = datetime.now().isoformat()
+        job_store.update(
+            job_id,
+            status="failed",
+            message=f"Recording failed: {str(e)}",
+            completed_at=datetime.now().isoformat(),
+        )
 
 if __name__ == "__main__":
     import uvicorn
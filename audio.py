@@ -0,0 +1,332 @@
+import asyncio
+import os
+import re
+import subprocess
+
+from bisect import bisect_left, bisect_right
+
+# Audio formats the recording can be reduced to before upload.
+# Each entry maps to (file extension, content type, ffmpeg codec arguments).
+AUDIO_FORMATS = {
+    "opus": ("ogg", "audio/ogg", "-c:a libopus -b:a 24k -application voip"),
+    "flac": ("flac", "audio/flac", "-c:a flac -compression_level 5"),
+}
+
+# Sample rate and channel count used for every extracted audio file
+AUDIO_SAMPLE_RATE = 16000
+AUDIO_CHANNELS = 1
+
+
+def get_audio_format():
+    """
+    Audio format used for the upload, "none" keeps the original recording
+    """
+    return os.getenv("AUDIO_UPLOAD_FORMAT", "opus").lower()
+
+
+def audio_content_type(file_path):
+    extension = os.path.splitext(file_path)[1][1:]
+    for format_extension, content_type, _ in AUDIO_FORMATS.values():
+        if extension == format_extension:
+            return content_type
+    return "video/" + extension
+
+
+def build_extract_command(input_path, output_path, audio_format):
+    _, _, codec_args = AUDIO_FORMATS[audio_format]
+    return (
+        f'ffmpeg -y -loglevel error -i "{input_path}" -vn -sn -dn '
+        f"-ac {AUDIO_CHANNELS} -ar {AUDIO_SAMPLE_RATE} {codec_args} "
+        f'"{output_path}"'
+    )
+
+
+async def extract_audio(input_path, audio_format=None):
+    """
+    Transcode the audio track of a recording to a small mono 16 kHz file.
+
+    The original recording is left untouched. Returns the path to upload,
+    which is the original file when extraction is disabled or fails.
+    """
+    audio_format = audio_format or get_audio_format()
+    if audio_format not in AUDIO_FORMATS:
+        return input_path
+
+    extension, _, _ = AUDIO_FORMATS[audio_format]
+    output_path = f"{os.path.splitext(input_path)[0]}_audio.{extension}"
+
+    process = await asyncio.create_subprocess_shell(
+        build_extract_command(input_path, output_path, audio_format),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    _, stderr = await process.communicate()
+
+    if process.returncode != 0 or not os.path.exists(output_path):
+        print(f"- Audio extraction failed, uploading original file: {stderr.decode()}")
+        return input_path
+
+    print(
+        f"- Extracted audio {output_path} "
+        f"({os.path.getsize(output_path)} bytes, "
+        f"original {os.path.getsize(input_path)} bytes)"
+    )
+    return output_path
+
+
+# Silences longer than SILENCE_TRIM_MIN_SECONDS are cut from the upload,
+# keeping SILENCE_TRIM_PADDING_SECONDS of them on each side of the speech
+SILENCE_TRIM = os.getenv("SILENCE_TRIM", "true").lower() in ("true", "1", "yes")
+SILENCE_TRIM_NOISE_DB = int(os.getenv("SILENCE_TRIM_NOISE_DB", -45))
+SILENCE_TRIM_MIN_SECONDS = float(os.getenv("SILENCE_TRIM_MIN_SECONDS", 2))
+SILENCE_TRIM_PADDING_SECONDS = float(os.getenv("SILENCE_TRIM_PADDING_SECONDS", 0.5))
+
+# Cuts are made on frames of this many seconds, so the speech kept adds up
+# exactly and timestamps map back without drift
+TRIM_FRAME_SECONDS = 0.01
+TRIM_FRAME_SAMPLES = int(AUDIO_SAMPLE_RATE * TRIM_FRAME_SECONDS)
+
+SILENCE_START = re.compile(r"silence_start: (-?[\d.]+)")
+SILENCE_END = re.compile(r"silence_end: (-?[\d.]+)")
+
+
+def _to_frame(seconds):
+    return round(seconds / TRIM_FRAME_SECONDS) * TRIM_FRAME_SECONDS
+
+
+async def detect_silences(input_path, noise_db=None, min_seconds=None):
+    """
+    (start, end) of the silences of a file, end is None for a silence
+    lasting until the end of the file
+    """
+    noise_db = SILENCE_TRIM_NOISE_DB if noise_db is None else noise_db
+    min_seconds = min_seconds or SILENCE_TRIM_MIN_SECONDS
+    process = await asyncio.create_subprocess_exec(
+        "ffmpeg",
+        "-hide_banner",
+        "-nostats",
+        "-i",
+        input_path,
+        "-vn",
+        "-af",
+        f"silencedetect=noise={noise_db}dB:d={min_seconds}",
+        "-f",
+        "null",
+        "-",
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    _, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(f"silencedetect failed: {stderr.decode()[-500:]}")
+
+    silences = []
+    start = None
+    for line in stderr.decode(errors="replace").splitlines():
+        match = SILENCE_START.search(line)
+        if match:
+            start = max(float(match.group(1)), 0)
+            continue
+        match = SILENCE_END.search(line)
+        if match and start is not None:
+            silences.append((start, float(match.group(1))))
+            start = None
+    if start is not None:
+        silences.append((start, None))
+    return silences
+
+
+def speech_regions(silences, padding=None):
+    """
+    (start, end) of the parts of the recording kept around the silences,
+    on TRIM_FRAME_SECONDS boundaries; end is None for the end of the file
+    """
+    padding = SILENCE_TRIM_PADDING_SECONDS if padding is None else padding
+    regions = []
+    start = 0
+    for silence_start, silence_end in silences:
+        cut_start = _to_frame(silence_start + padding) if silence_start > 0 else 0
+        if silence_end is None:
+            if cut_start > start:
+                regions.append((start, cut_start))
+            return regions
+        cut_end = _to_frame(silence_end - padding)
+        if cut_end <= cut_start:
+            continue
+        if cut_start > start:
+            regions.append((start, cut_start))
+        start = cut_end
+    regions.append((start, None))
+    return regions
+
+
+def offset_map(regions):
+    """
+    (trimmed_start, original_start) of each region once concatenated
+    """
+    offsets = []
+    trimmed = 0
+    for start, end in regions:
+        offsets.append((round(trimmed, 6), start))
+        if end is not None:
+            trimmed += end - start
+    return offsets
+
+
+def build_trim_command(input_path, output_path, audio_format, regions):
+    _, _, codec_args = AUDIO_FORMATS[audio_format]
+    # half a frame of margin, frame timestamps are exact multiples
+    margin = TRIM_FRAME_SECONDS / 2
+    selected = "+".join(
+        f"gte(t,{start - margin:.3f})"
+        + (f"*lt(t,{end - margin:.3f})" if end is not None else "")
+        for start, end in regions
+    )
+    audio_filter = (
+        f"aresample={AUDIO_SAMPLE_RATE},asetnsamples=n={TRIM_FRAME_SAMPLES}:p=0,"
+        f"aselect='{selected}',asetpts=N/SR/TB"
+    )
+    return [
+        "ffmpeg",
+        "-y",
+        "-loglevel",
+        "error",
+        "-i",
+        input_path,
+        "-vn",
+        "-sn",
+        "-dn",
+        "-af",
+        audio_filter,
+        "-ac",
+        str(AUDIO_CHANNELS),
+        "-ar",
+        str(AUDIO_SAMPLE_RATE),
+        *codec_args.split(),
+        output_path,
+    ]
+
+
+async def trim_silence(input_path, audio_format=None):
+    """
+    Write the speech of a file without its long silences, for upload.
+
+    Returns the path to upload and the offset map of the cuts, or the
+    original path and None when trimming is disabled, finds nothing to cut
+    or fails.
+    """
+    audio_format = audio_format or get_audio_format()
+    if not SILENCE_TRIM or audio_format not in AUDIO_FORMATS:
+        return input_path, None
+
+    try:
+        silences = await detect_silences(input_path)
+    except RuntimeError as e:
+        print(f"- Silence detection failed, uploading untrimmed audio: {e}")
+        return input_path, None
+    regions = speech_regions(silences)
+    if not regions or regions == [(0, None)]:
+        # no silence worth cutting, or nothing but silence
+        return input_path, None
+
+    extension, _, _ = AUDIO_FORMATS[audio_format]
+    output_path = f"{os.path.splitext(input_path)[0]}_speech.{extension}"
+    process = await asyncio.create_subprocess_exec(
+        *build_trim_command(input_path, output_path, audio_format, regions),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    _, stderr = await process.communicate()
+
+    if process.returncode != 0 or not os.path.exists(output_path):
+        print(f"- Silence trimming failed, uploading untrimmed audio: {stderr.decode()}")
+        return input_path, None
+
+    # silence before each region, the trailing one is not counted
+    cut_ends = [0] + [end for _, end in regions[:-1]]
+    removed = sum(start - cut_end for (start, _), cut_end in zip(regions, cut_ends))
+    print(
+        f"- Trimmed {removed:.1f}s of silence in {len(regions) - 1} cuts "
+        f"({os.path.getsize(output_path)} bytes, "
+        f"untrimmed {os.path.getsize(input_path)} bytes)"
+    )
+    return output_path, offset_map(regions)
+
+
+def preparation_options(extract, audio_format=None):
+    """
+    Settings deciding the audio extract_audio and trim_silence make of a
+    recording, so its transcription can be keyed by the original recording
+    instead of the re-encoded upload, whose bytes differ between runs
+    """
+    audio_format = audio_format or get_audio_format()
+    if audio_format not in AUDIO_FORMATS:
+        return {"audio_format": None}
+    options = {
+        "audio_format": audio_format,
+        "extract": extract,
+        "sample_rate": AUDIO_SAMPLE_RATE,
+        "channels": AUDIO_CHANNELS,
+        "silence_trim": None,
+    }
+    if SILENCE_TRIM:
+        options["silence_trim"] = [
+            SILENCE_TRIM_NOISE_DB,
+            SILENCE_TRIM_MIN_SECONDS,
+            SILENCE_TRIM_PADDING_SECONDS,
+        ]
+    return options
+
+
+def original_time(seconds, offsets, end=False, starts=None):
+    """
+    Time on the original recording of a time of the trimmed upload; an end
+    time on a cut stays at the end of the region before it
+    """
+    starts = starts or [trimmed for trimmed, _ in offsets]
+    index = (bisect_left if end else bisect_right)(starts, seconds)
+    trimmed_start, original_start = offsets[max(index - 1, 0)]
+    return original_start + seconds - trimmed_start
+
+
+def _remap_timestamps(value, offsets, starts):
+    if isinstance(value, list):
+        for item in value:
+            _remap_timestamps(item, offsets, starts)
+    elif isinstance(value, dict):
+        for key in ("start", "end"):
+            if isinstance(value.get(key), (int, float)):
+                value[key] = original_time(value[key], offsets, key == "end", starts)
+        # words of utterances, results of sentences, translation...
+        for item in value.values():
+            if isinstance(item, (list, dict)):
+                _remap_timestamps(item, offsets, starts)
+
+
+def remap_transcript(response, offsets):
+    """
+    Move every start/end timestamp of a Gladia result on the trimmed upload
+    back to the original recording timeline, in place.
+
+    metadata.audio_duration becomes the recording's duration, the uploaded
+    one is kept as metadata.trimmed_audio_duration. The text of
+    transcription.subtitles stays on the trimmed timeline; transcript.srt
+    and transcript.vtt are written from the remapped utterances.
+    """
+    result = response.get("result") or {}
+    starts = [trimmed for trimmed, _ in offsets]
+    for key, section in result.items():
+        if key != "metadata":
+            _remap_timestamps(section, offsets, starts)
+
+    metadata = result.get("metadata")
+    if isinstance(metadata, dict) and isinstance(
+        metadata.get("audio_duration"), (int, float)
+    ):
+        duration = metadata["audio_duration"]
+        metadata["trimmed_audio_duration"] = duration
+        # the last speech region runs to the end of the recording
+        metadata["audio_duration"] = round(
+            original_time(duration, offsets, True, starts), 3
+        )
+    return response
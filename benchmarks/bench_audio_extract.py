@@ -0,0 +1,78 @@
+"""
+Benchmark the audio extraction stage that runs before the Gladia upload.
+
+A synthetic meeting recording is generated with ffmpeg's lavfi sources using
+the same encoding settings as the recorder, then its audio track is extracted
+in every supported format. Reports the upload size and the estimated upload
+time saved for a given uplink bandwidth.
+
+Usage: python benchmarks/bench_audio_extract.py --duration 300 --uplink-mbps 20
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio import AUDIO_FORMATS, extract_audio  # noqa: E402
+
+
+def make_recording(path, duration):
+    command = (
+        f"ffmpeg -y -loglevel error "
+        f"-f lavfi -i testsrc2=size=1920x1080:rate=30 "
+        f"-f lavfi -i sine=frequency=440:sample_rate=44100 "
+        f"-t {duration} -c:v libx264 -pix_fmt yuv420p -c:a aac -strict experimental "
+        f'"{path}"'
+    )
+    subprocess.check_call(command, shell=True)
+
+
+def upload_seconds(size, uplink_mbps):
+    return size * 8 / (uplink_mbps * 1_000_000)
+
+
+@click.command()
+@click.option("--duration", default=120, help="Length of the synthetic recording in seconds")
+@click.option("--uplink-mbps", default=20.0, help="Uplink bandwidth used to estimate upload time")
+def main(duration, uplink_mbps):
+    with tempfile.TemporaryDirectory() as workdir:
+        recording = os.path.join(workdir, "output.mp4")
+        click.echo(f"Generating {duration}s synthetic recording...")
+        make_recording(recording, duration)
+
+        original_size = os.path.getsize(recording)
+        original_upload = upload_seconds(original_size, uplink_mbps)
+        click.echo(
+            f"{'format':<8} {'bytes':>14} {'ratio':>8} {'extract s':>10} "
+            f"{'upload s':>10} {'saved s':>10}"
+        )
+        click.echo(
+            f"{'mp4':<8} {original_size:>14} {1:>8.1f} {0:>10.2f} "
+            f"{original_upload:>10.2f} {0:>10.2f}"
+        )
+
+        for audio_format in AUDIO_FORMATS:
+            start = time.perf_counter()
+            audio_path = asyncio.run(extract_audio(recording, audio_format))
+            extract_time = time.perf_counter() - start
+            if audio_path == recording:
+                click.echo(f"{audio_format:<8} extraction failed")
+                continue
+
+            size = os.path.getsize(audio_path)
+            upload = upload_seconds(size, uplink_mbps)
+            saved = original_upload - upload - extract_time
+            click.echo(
+                f"{audio_format:<8} {size:>14} {original_size / size:>8.1f} "
+                f"{extract_time:>10.2f} {upload:>10.2f} {saved:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark the video encoding profiles of full recordings.
+
+Each profile encodes the same synthetic screen as fast as it can, with the
+recorder's exact output settings. The screen comes from a lavfi source
+(--source static for a meeting where nobody moves, motion for a shared
+video) or from a running Xvfb display with --display. Generating the
+source is timed separately and subtracted from the CPU seconds.
+
+Reports CPU seconds per recorded second, the realtime factor, the output
+size, and how many recordings of that profile fit real-time on --cores.
+
+Usage: python benchmarks/bench_encoding_profiles.py --duration 60 --cores 8
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recording import (  # noqa: E402
+    ENCODING_PROFILES,
+    SCREEN_SIZE,
+    video_input_args,
+    video_output_args,
+)
+
+SOURCES = {
+    "static": "smptehdbars=size={size}:rate={rate}",
+    "motion": "testsrc2=size={size}:rate={rate}",
+}
+
+
+def screen_input(profile, source, display):
+    if display:
+        return video_input_args(profile, display)
+    return "-f lavfi -i " + SOURCES[source].format(size=SCREEN_SIZE, rate=profile.framerate)
+
+
+def children_cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run(command):
+    cpu_before = children_cpu_seconds()
+    start = time.perf_counter()
+    subprocess.check_call(command, shell=True)
+    return children_cpu_seconds() - cpu_before, time.perf_counter() - start
+
+
+@click.command()
+@click.option("--duration", default=30, help="Seconds of screen encoded per profile")
+@click.option("--source", type=click.Choice(list(SOURCES)), default="static")
+@click.option("--display", default=None, help="Capture this Xvfb display instead of lavfi")
+@click.option("--cores", default=os.cpu_count() or 1, help="Cores available to recordings")
+def main(duration, source, display, cores):
+    audio = "-f lavfi -i sine=frequency=440:sample_rate=44100"
+    with tempfile.TemporaryDirectory() as workdir:
+        click.echo(
+            f"{'profile':<9} {'cpu s/s':>8} {'realtime':>9} {'bytes':>12} {'slots':>6}"
+        )
+        for name, profile in ENCODING_PROFILES.items():
+            inputs = f"{screen_input(profile, source, display)} {audio}"
+
+            # cost of producing the frames, paid by Xvfb/Chrome in production
+            baseline_cpu, _ = run(
+                f"ffmpeg -y -loglevel error {inputs} -t {duration} -f null -"
+            )
+
+            output_path = os.path.join(workdir, f"{name}.mp4")
+            cpu, wall = run(
+                f"ffmpeg -y -loglevel error {inputs} -t {duration} "
+                f"{video_output_args(profile)} {output_path}"
+            )
+            cpu_per_second = max(cpu - baseline_cpu, 0) / duration
+            slots = int(cores / cpu_per_second) if cpu_per_second else float("inf")
+            click.echo(
+                f"{name:<9} {cpu_per_second:>8.3f} {duration / wall:>8.1f}x "
+                f"{os.path.getsize(output_path):>12} {slots:>6}"
+            )
+
+
+if __name__ == "__main__":
+    main()
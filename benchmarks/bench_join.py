@@ -0,0 +1,70 @@
+"""
+Measure time-to-join against a locally served mock of the Meet pages.
+
+benchmarks/mock_meet.html recreates the elements join_call looks for, with
+configurable render and admission delays, so the join flow can be timed
+without a Google account or a real meeting.
+
+Usage: python benchmarks/bench_join.py --runs 3 --prejoin-ms 1500 --admit-ms 2000
+"""
+import asyncio
+import functools
+import http.server
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import click
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from gmeet import join_call, launch_browser  # noqa: E402
+
+
+def serve_mock():
+    handler = functools.partial(
+        http.server.SimpleHTTPRequestHandler, directory=BENCH_DIR
+    )
+    handler.log_message = lambda *args: None
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@click.command()
+@click.option("--runs", default=3, help="Number of joins to time")
+@click.option("--prejoin-ms", default=1500, help="Delay before the pre-join screen renders")
+@click.option("--admit-ms", default=2000, help="Delay before the bot is admitted")
+def main(runs, prejoin_ms, admit_ms):
+    server = serve_mock()
+    url = (
+        f"http://127.0.0.1:{server.server_port}/mock_meet.html"
+        f"?prejoin={prejoin_ms}&admit={admit_ms}"
+    )
+
+    with tempfile.TemporaryDirectory() as workdir:
+        driver = launch_browser(os.path.join(workdir, "chromedriver.log"))
+        try:
+            timings = []
+            for run in range(runs):
+                start = time.perf_counter()
+                joined = asyncio.run(join_call(driver, url, "Bench", 1))
+                elapsed = time.perf_counter() - start
+                timings.append(elapsed)
+                click.echo(f"run {run + 1}: joined={joined} time_to_join={elapsed:.2f}s")
+        finally:
+            driver.quit()
+            server.shutdown()
+
+    page_delay = (prejoin_ms + admit_ms) / 1000
+    click.echo(
+        f"mean time_to_join={sum(timings) / len(timings):.2f}s "
+        f"(page-imposed delay {page_delay:.2f}s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark the CPU cost of each recording mode.
+
+Every mode records the same synthetic meeting in real time with the same
+output settings as the recorder. The screen and microphone come from
+ffmpeg's lavfi sources, or from a running Xvfb display with --display.
+Reports the CPU seconds used, the share of one core and how many
+recordings of that mode one core can sustain.
+
+Usage: python benchmarks/bench_recording_modes.py --duration 30
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recording import (  # noqa: E402
+    RECORDING_MODES,
+    SCREEN_SIZE,
+    encoding_profile,
+    has_video,
+    output_args,
+    recording_extension,
+    video_input_args,
+)
+
+
+def synthetic_inputs(mode, display):
+    audio = "-f lavfi -i sine=frequency=440:sample_rate=44100"
+    if not has_video(mode):
+        # -re keeps the capture in real time, like a live pulse source
+        return f"-re {audio}"
+    profile = encoding_profile(mode)
+    if display:
+        video = video_input_args(profile, display)
+    else:
+        video = f"-re -f lavfi -i testsrc2=size={SCREEN_SIZE}:rate={profile.framerate}"
+    return f"{video} -re {audio}"
+
+
+def children_cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def record(mode, duration, workdir, display):
+    output_path = os.path.join(workdir, f"{mode}.{recording_extension(mode)}")
+    command = (
+        f"ffmpeg -y -loglevel error {synthetic_inputs(mode, display)} "
+        f"-t {duration} {output_args(mode)} {output_path}"
+    )
+    cpu_before = children_cpu_seconds()
+    start = time.perf_counter()
+    subprocess.check_call(command, shell=True)
+    wall = time.perf_counter() - start
+    return children_cpu_seconds() - cpu_before, wall, os.path.getsize(output_path)
+
+
+@click.command()
+@click.option("--duration", default=30, help="Seconds recorded per mode")
+@click.option("--display", default=None, help="Record this Xvfb display instead of lavfi")
+def main(duration, display):
+    with tempfile.TemporaryDirectory() as workdir:
+        click.echo(
+            f"{'mode':<8} {'cpu s':>8} {'core %':>8} {'per core':>9} "
+            f"{'wall s':>8} {'bytes':>12}"
+        )
+        for mode in RECORDING_MODES:
+            cpu, wall, size = record(mode, duration, workdir, display)
+            core_share = cpu / duration
+            per_core = 1 / core_share if core_share else float("inf")
+            click.echo(
+                f"{mode:<8} {cpu:>8.2f} {core_share * 100:>8.1f} {per_core:>9.1f} "
+                f"{wall:>8.1f} {size:>12}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+import asyncio
+import os
+import time
+
+import psutil
+
+from debug_capture import NO_CAPTURE, DebugCapture
+from gmeet import launch_browser, setup_virtual_audio, sign_in
+from metrics import phase
+
+# Number of recording slots kept with an idle, signed-in browser
+WARM_POOL_SIZE = int(os.getenv("WARM_POOL_SIZE", 0))
+# Account the warm browsers are signed in with
+WARM_POOL_EMAIL = os.getenv("WARM_POOL_EMAIL", "")
+WARM_POOL_PASSWORD = os.getenv("WARM_POOL_PASSWORD", "")
+
+# Browsers are recycled after this many jobs or above this memory usage
+BROWSER_MAX_USES = int(os.getenv("BROWSER_MAX_USES", 10))
+BROWSER_MAX_RSS_MB = int(os.getenv("BROWSER_MAX_RSS_MB", 1500))
+
+POOL_DIR = os.path.join("recordings", "browser_pool")
+
+
+class PooledBrowser:
+    """
+    A Chrome driver bound to one slot display and signed in to one account
+    """
+
+    def __init__(self, driver, email, display):
+        self.driver = driver
+        self.email = email
+        self.display = display
+        self.uses = 0
+        self.created_at = time.time()
+
+    def rss_mb(self):
+        """
+        Resident memory of the browser and all its child processes
+        """
+        pid = getattr(self.driver, "browser_pid", None)
+        if not pid:
+            return 0
+        try:
+            process = psutil.Process(pid)
+            processes = [process] + process.children(recursive=True)
+        except psutil.Error:
+            return 0
+        total = 0
+        for p in processes:
+            try:
+                total += p.memory_info().rss
+            except psutil.Error:
+                pass
+        return total / 2**20
+
+    def healthy(self):
+        try:
+            return self.driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            print(f"Error closing browser on {self.display}: {e}")
+
+
+class BrowserPool:
+    """
+    Keeps idle, already signed-in browsers on recording slot displays.
+
+    A display never hosts more than one browser, since ffmpeg records the
+    whole screen. Jobs check a browser out for their slot and give it back
+    when the recording ends; a browser of the pool account on a warm slot is
+    then kept for the next job unless it has been used BROWSER_MAX_USES
+    times, grew past BROWSER_MAX_RSS_MB or stopped responding. Any other
+    browser is quit, so no job's account stays signed in.
+    """
+
+    def __init__(
+        self,
+        slots=(),
+        size=WARM_POOL_SIZE,
+        email=WARM_POOL_EMAIL,
+        password=WARM_POOL_PASSWORD,
+    ):
+        self.warm_slots = list(slots)[:size] if email and password else []
+        self.email = email
+        self.password = password
+        self._idle = {}
+        self._in_use = set()
+        self._locks = {}
+        self._fill_task = None
+
+    def _lock(self, display):
+        if display not in self._locks:
+            self._locks[display] = asyncio.Lock()
+        return self._locks[display]
+
+    def has_idle(self, display, email):
+        browser = self._idle.get(display)
+        return browser is not None and browser.email == email
+
+    def keeps(self, browser):
+        """
+        True for a browser of the pool account on a warm slot
+        """
+        return browser.email == self.email and any(
+            slot.display == browser.display for slot in self.warm_slots
+        )
+
+    @property
+    def idle_count(self):
+        return len(self._idle)
+
+    async def _launch(self, email, password, display, audio_sink, workdir, capture):
+        with phase("browser_launch"):
+            driver = await asyncio.to_thread(
+                launch_browser,
+                os.path.join(workdir, "chromedriver.log"),
+                display,
+                audio_sink,
+            )
+        try:
+            print(f"Signing in browser on {display}")
+            with phase("sign_in"):
+                await sign_in(email, password, driver, capture)
+        except BaseException as e:
+            capture.finish(failed=True, reason=f"Sign in failed: {e!r}")
+            await asyncio.to_thread(driver.quit)
+            raise
+        return PooledBrowser(driver, email, display)
+
+    async def acquire(self, config, capture=NO_CAPTURE):
+        """
+        Check out a signed-in browser for the job's slot, launching one if
+        no usable idle browser is waiting there.
+        """
+        async with self._lock(config.display):
+            browser = self._idle.pop(config.display, None)
+            if browser is not None:
+                healthy = await asyncio.to_thread(browser.healthy)
+                if browser.email == config.email and healthy:
+                    print(f"Using warm browser on {config.display}")
+                    self._in_use.add(config.display)
+                    return browser
+                await asyncio.to_thread(browser.quit)
+
+            browser = await self._launch(
+                config.email,
+                config.password,
+                config.display,
+                config.audio_sink,
+                config.output_dir,
+                capture,
+            )
+            self._in_use.add(config.display)
+            return browser
+
+    async def release(self, browser):
+        """
+        Take a browser back after a job, keeping it warm if it belongs to the
+        pool and is not worn out
+        """
+        browser.uses += 1
+        if not self.keeps(browser):
+            await asyncio.to_thread(browser.quit)
+            self._in_use.discard(browser.display)
+            self.schedule_fill()
+            return
+
+        try:
+            # leaving the page leaves the meeting
+            await asyncio.to_thread(browser.driver.get, "about:blank")
+            rss_mb = await asyncio.to_thread(browser.rss_mb)
+            reusable = browser.uses < BROWSER_MAX_USES and rss_mb < BROWSER_MAX_RSS_MB
+        except Exception:
+            reusable = False
+
+        if reusable:
+            self._idle[browser.display] = browser
+        else:
+            print(f"Recycling browser on {browser.display} after {browser.uses} uses")
+            await asyncio.to_thread(browser.quit)
+
+        self._in_use.discard(browser.display)
+        self.schedule_fill()
+
+    def schedule_fill(self):
+        if self.warm_slots and (self._fill_task is None or self._fill_task.done()):
+            self._fill_task = asyncio.create_task(self.fill())
+
+    async def fill(self):
+        """
+        Pre-launch and sign in a browser on every warm slot that has none
+        """
+        setup_virtual_audio()
+        for slot in self.warm_slots:
+            async with self._lock(slot.display):
+                if slot.display in self._idle or slot.display in self._in_use:
+                    continue
+                try:
+                    await asyncio.to_thread(slot.prepare)
+                    self._idle[slot.display] = await self._launch(
+                        self.email,
+                        self.password,
+                        slot.display,
+                        slot.audio_sink,
+                        POOL_DIR,
+                        DebugCapture(os.path.join(POOL_DIR, "screenshots")),
+                    )
+                except Exception as e:
+                    print(f"Could not warm a browser on {slot.display}: {e}")
+
+    async def close(self):
+        if self._fill_task is not None:
+            self._fill_task.cancel()
+        for browser in list(self._idle.values()):
+            await asyncio.to_thread(browser.quit)
+        self._idle.clear()
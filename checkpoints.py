@@ -0,0 +1,72 @@
+import json
+import os
+import tempfile
+
+CHECKPOINT_FILE = "checkpoint.json"
+
+# Stages of a job, in order; each one is saved once it is complete
+STAGES = ("recorded", "prepared", "uploaded", "requested", "transcribed")
+
+
+class Checkpoint:
+    """
+    Progress of a job persisted in its workspace, so a failed or
+    interrupted job resumes from its last completed stage instead of
+    recording the meeting again.
+
+    Holds the recording path, the audio prepared for upload and its offset
+    map, Gladia's audio_url and result_url, and the job's config.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path) as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            self.data = {}
+
+    @property
+    def stage(self):
+        return self.data.get("stage")
+
+    def reached(self, stage):
+        """
+        True once stage, or a later one, is complete
+        """
+        return self.stage is not None and STAGES.index(self.stage) >= STAGES.index(
+            stage
+        )
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def reset(self, **fields):
+        """
+        Start the job over with only fields saved
+        """
+        self.data = {}
+        self.update(**fields)
+
+    def update(self, **fields):
+        """
+        Save fields, a stage=... field marks that stage as complete
+        """
+        self.data.update(fields)
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        # written atomically and readable by the owner only: it holds the
+        # Gladia API key needed to resume the transcription
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.data, f, indent=2)
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, self.path)
+
+    def rewind(self, stage, *keys):
+        """
+        Go back to stage, forgetting keys saved by the stages after it
+        """
+        for key in keys:
+            self.data.pop(key, None)
+        self.update(stage=stage)
@@ -0,0 +1,118 @@
+import base64
+import collections
+import gzip
+import os
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+# off:  no captures at all
+# ring: keep the last DEBUG_CAPTURE_RING_SIZE captures, at most one every
+#       DEBUG_CAPTURE_MIN_INTERVAL seconds, written to disk only on failure
+# full: keep every capture and always write them at the end of the job
+DEBUG_CAPTURE_LEVELS = ("off", "ring", "full")
+DEBUG_CAPTURE = os.getenv("DEBUG_CAPTURE", "ring").lower()
+DEBUG_CAPTURE_RING_SIZE = int(os.getenv("DEBUG_CAPTURE_RING_SIZE", 8))
+DEBUG_CAPTURE_MIN_INTERVAL = float(os.getenv("DEBUG_CAPTURE_MIN_INTERVAL", 2))
+
+# Decoding and compression happen off the join path, on a shared thread
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="debug-capture")
+
+
+def _encode(screenshot_b64, page_source):
+    png = base64.b64decode(screenshot_b64) if screenshot_b64 else None
+    html = gzip.compress(page_source.encode(), compresslevel=6) if page_source else None
+    return png, html
+
+
+class DebugCapture:
+    """
+    In-memory screenshots and page sources of a job's browser, kept for
+    forensics instead of being written to disk at every step.
+    """
+
+    def __init__(
+        self,
+        output_dir="screenshots",
+        level=DEBUG_CAPTURE,
+        ring_size=DEBUG_CAPTURE_RING_SIZE,
+        min_interval=DEBUG_CAPTURE_MIN_INTERVAL,
+    ):
+        if level not in DEBUG_CAPTURE_LEVELS:
+            level = "ring"
+        self.output_dir = output_dir
+        self.level = level
+        self.min_interval = min_interval if level == "ring" else 0
+        self._captures = collections.deque(
+            maxlen=ring_size if level == "ring" else None
+        )
+        self._sequence = 0
+        self._last_capture = 0
+
+    @property
+    def enabled(self):
+        return self.level != "off"
+
+    def snapshot(self, driver, name, page_source=False):
+        """
+        Capture the current page under name; a no-op when disabled or when
+        sampled out in ring mode.
+        """
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        if not page_source and now - self._last_capture < self.min_interval:
+            return
+        self._last_capture = now
+
+        try:
+            # base64 is what the driver returns, decoding is left to the executor
+            screenshot = driver.get_screenshot_as_base64()
+            source = driver.page_source if page_source else None
+        except Exception as e:
+            print(f"Debug capture {name} failed: {e}")
+            return
+
+        self._sequence += 1
+        future = _executor.submit(_encode, screenshot, source)
+        self._captures.append((self._sequence, name, future))
+
+    def flush(self, reason=None):
+        """
+        Write the kept captures to the output folder and return their count
+        """
+        if not self._captures:
+            return 0
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        written = 0
+        for sequence, name, future in list(self._captures):
+            png, html = future.result()
+            prefix = os.path.join(self.output_dir, f"{sequence:03d}_{name}")
+            if png:
+                with open(f"{prefix}.png", "wb") as f:
+                    f.write(png)
+            if html:
+                with open(f"{prefix}.html.gz", "wb") as f:
+                    f.write(html)
+            written += 1
+        self._captures.clear()
+
+        if reason:
+            with open(os.path.join(self.output_dir, "reason.txt"), "w") as f:
+                f.write(f"{reason}\n")
+        print(f"Wrote {written} debug captures to {self.output_dir}")
+        return written
+
+    def finish(self, failed=False, reason=None):
+        """
+        End of the captured phase: flush on failure, or always in full mode
+        """
+        if failed or self.level == "full":
+            self.flush(reason)
+        else:
+            self._captures.clear()
+
+
+# Used when the caller does not trace anything
+NO_CAPTURE = DebugCapture(level="off")
@@ -0,0 +1,224 @@
+import asyncio
+import gzip
+import mimetypes
+import os
+import re
+import shutil
+import tempfile
+
+from email.utils import formatdate
+
+from starlette.responses import Response
+
+# Size of each read when the server can't send the file itself
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", 1024 * 1024))
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def media_type_of(path):
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+def file_etag(stat_result, suffix=""):
+    # finished recordings and transcripts never change in place: size and
+    # modification time identify their content
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}{suffix}"'
+
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    # weak comparison, as If-None-Match requires
+    return etag in candidates or f"W/{etag}" in candidates
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive of a single bytes range, None to send the whole
+    file, or "unsatisfiable"
+    """
+    match = RANGE_PATTERN.match(header.strip()) if header else None
+    if match is None:
+        # no range, several ranges or another unit: the whole file
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # suffix range, the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            return "unsatisfiable"
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return "unsatisfiable"
+    return start, end
+
+
+class RangeFileResponse(Response):
+    """
+    Response streaming a file, or the byte range the client asked for.
+
+    Honors If-None-Match (304), Range and If-Range (206 or 416). The file
+    is handed to the server for a zero-copy send when it supports the
+    http.response.zerocopysend or http.response.pathsend ASGI extensions,
+    and read in DOWNLOAD_CHUNK_SIZE chunks in a thread otherwise.
+    """
+
+    def __init__(
+        self,
+        path,
+        request,
+        media_type=None,
+        filename=None,
+        content_encoding=None,
+        etag_suffix="",
+    ):
+        self.path = path
+        self.media_type = media_type or media_type_of(path)
+        self.background = None
+        self.send_header_only = request.method == "HEAD"
+
+        stat_result = os.stat(path)
+        size = stat_result.st_size
+        etag = file_etag(stat_result, etag_suffix)
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": etag,
+            "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+        }
+        if filename:
+            headers["content-disposition"] = f'attachment; filename="{filename}"'
+        if content_encoding:
+            headers["content-encoding"] = content_encoding
+            headers["vary"] = "Accept-Encoding"
+
+        self.offset, self.count = 0, size
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            self.status_code = 304
+            self.count = 0
+        else:
+            byte_range = None
+            if_range = request.headers.get("if-range")
+            # a range of another version of the file would be corrupt
+            if not if_range or if_range == etag:
+                byte_range = parse_range(request.headers.get("range"), size)
+            if byte_range == "unsatisfiable":
+                self.status_code = 416
+                self.count = 0
+                headers["content-range"] = f"bytes */{size}"
+                headers["content-length"] = "0"
+            elif byte_range is not None:
+                start, end = byte_range
+                self.status_code = 206
+                self.offset, self.count = start, end - start + 1
+                headers["content-range"] = f"bytes {start}-{end}/{size}"
+                headers["content-length"] = str(self.count)
+            else:
+                self.status_code = 200
+                headers["content-length"] = str(size)
+        self.size = size
+        self.init_headers(headers)
+
+    async def __call__(self, scope, receive, send):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        if self.send_header_only or self.count == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        extensions = scope.get("extensions") or {}
+        with open(self.path, "rb") as f:
+            if "http.response.zerocopysend" in extensions:
+                await send(
+                    {
+                        "type": "http.response.zerocopysend",
+                        "file": f.fileno(),
+                        "offset": self.offset,
+                        "count": self.count,
+                    }
+                )
+                return
+            if "http.response.pathsend" in extensions and self.count == self.size:
+                await send({"type": "http.response.pathsend", "path": self.path})
+                return
+
+            offset, remaining = self.offset, self.count
+            while remaining:
+                # pread keeps the reads independent of the file position
+                chunk = await asyncio.to_thread(
+                    os.pread, f.fileno(), min(DOWNLOAD_CHUNK_SIZE, remaining), offset
+                )
+                if not chunk:
+                    break
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": remaining > 0,
+                    }
+                )
+            if remaining:
+                # the file shrank while being sent
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def accepts_gzip(request):
+    encodings = request.headers.get("accept-encoding", "")
+    for encoding in encodings.split(","):
+        name, _, params = encoding.strip().partition(";")
+        if name.strip() in ("gzip", "*") and params.replace(" ", "") != "q=0":
+            return True
+    return False
+
+
+def gzipped_copy(path):
+    """
+    Path of a gzip copy of a file, compressed once next to it and again
+    only when the file changes
+    """
+    gzip_path = path + ".gz"
+    try:
+        if os.stat(gzip_path).st_mtime_ns >= os.stat(path).st_mtime_ns:
+            return gzip_path
+    except OSError:
+        pass
+    directory = os.path.dirname(gzip_path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    with open(path, "rb") as source, os.fdopen(fd, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6, mtime=0) as target:
+            shutil.copyfileobj(source, target)
+    os.replace(tmp_path, gzip_path)
+    return gzip_path
+
+
+async def transcript_response(path, request, filename=None):
+    """
+    Response with a transcript, gzip-compressed for clients accepting it
+    """
+    if accepts_gzip(request):
+        gzip_path = await asyncio.to_thread(gzipped_copy, path)
+        return RangeFileResponse(
+            gzip_path,
+            request,
+            media_type_of(path),
+            filename=filename,
+            content_encoding="gzip",
+            etag_suffix="-gzip",
+        )
+    response = RangeFileResponse(path, request, filename=filename)
+    response.headers["vary"] = "Accept-Encoding"
+    return response
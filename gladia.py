@@ -0,0 +1,445 @@
+import asyncio
+import os
+import random
+import secrets
+import time
+import uuid
+
+import httpx
+
+from metrics import phase
+from tracing import add_event, set_attributes, span
+from transcript_cache import TRANSCRIPT_CACHE, cache_key, load_result, save_result
+
+# Base URL of the Gladia API, overridable to point at a local stand-in server
+GLADIA_API_URL = os.getenv("GLADIA_API_URL", "https://api.gladia.io").rstrip("/")
+
+# Size of each chunk read from disk and written to the socket during upload
+UPLOAD_CHUNK_SIZE = int(os.getenv("GLADIA_UPLOAD_CHUNK_SIZE", 1024 * 1024))
+
+# Connection pool shared by every job running in the process
+MAX_CONNECTIONS = int(os.getenv("GLADIA_MAX_CONNECTIONS", 20))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("GLADIA_MAX_KEEPALIVE_CONNECTIONS", 10))
+
+# Requests failing with a network error or one of these statuses are retried
+MAX_RETRIES = int(os.getenv("GLADIA_MAX_RETRIES", 3))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_BACKOFF_SECONDS = 1
+
+REQUEST_TIMEOUT = httpx.Timeout(
+    float(os.getenv("GLADIA_TIMEOUT_SECONDS", 60)), connect=10
+)
+
+# Result polling backs off exponentially, with jitter, up to a deadline
+POLL_INITIAL_INTERVAL = float(os.getenv("GLADIA_POLL_INITIAL_SECONDS", 1))
+POLL_MAX_INTERVAL = float(os.getenv("GLADIA_POLL_MAX_SECONDS", 30))
+POLL_BACKOFF_FACTOR = 1.5
+POLL_DEADLINE_SECONDS = float(os.getenv("GLADIA_POLL_TIMEOUT_SECONDS", 3600))
+
+# Public base URL of this API; when set, Gladia pushes completion to
+# {GLADIA_CALLBACK_BASE_URL}/gladia/callback?token=... instead of being polled
+GLADIA_CALLBACK_BASE_URL = os.getenv("GLADIA_CALLBACK_BASE_URL", "").rstrip("/")
+
+# In callback mode the result is still checked this often, in case a
+# callback is lost or delivered to another worker
+CALLBACK_FALLBACK_POLL_SECONDS = float(
+    os.getenv("GLADIA_CALLBACK_FALLBACK_POLL_SECONDS", 300)
+)
+
+_client = None
+
+# Callback token -> future resolved when its completion callback arrives.
+# Each transcription gets its own secret token in its callback URL, so only
+# Gladia can wake up the job waiting on it.
+_callbacks = {}
+
+
+def get_client():
+    """
+    Return the shared async HTTP client, creating it on first use
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=REQUEST_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            ),
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def send_request(method, url, **kwargs):
+    """
+    Send a request through the shared client, retrying transient failures
+    with exponential backoff.
+    """
+    client = get_client()
+    for attempt in range(MAX_RETRIES + 1):
+        last_attempt = attempt == MAX_RETRIES
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            if last_attempt:
+                raise
+            print(f"- {method} {url} failed ({e!r}), retrying...")
+            add_event("retry", method=method, url=url, attempt=attempt, error=repr(e))
+        else:
+            if response.status_code not in RETRY_STATUSES or last_attempt:
+                return response
+            print(f"- {method} {url} returned {response.status_code}, retrying...")
+            add_event(
+                "retry",
+                method=method,
+                url=url,
+                attempt=attempt,
+                status_code=response.status_code,
+            )
+        await asyncio.sleep(RETRY_BACKOFF_SECONDS * 2**attempt)
+
+
+def _callback_future(token):
+    if token not in _callbacks:
+        _callbacks[token] = asyncio.get_running_loop().create_future()
+    return _callbacks[token]
+
+
+def register_callback():
+    """
+    Token of a new completion callback, registered before the transcription
+    is requested so an early callback is not missed
+    """
+    token = secrets.token_urlsafe(32)
+    _callback_future(token)
+    return token
+
+
+def resolve_callback(token, payload):
+    """
+    Wake up the job waiting on the callback token.
+
+    Returns False, without creating anything, for a token nobody in this
+    worker waits for: a forged or stale callback, or one for another worker.
+    """
+    future = _callbacks.get(token) if token else None
+    if future is None:
+        return False
+    if not future.done():
+        future.set_result(payload)
+    return True
+
+
+def poll_intervals(initial=POLL_INITIAL_INTERVAL, maximum=POLL_MAX_INTERVAL):
+    """
+    Exponentially growing poll intervals with full jitter
+    """
+    interval = initial
+    while True:
+        yield random.uniform(initial, interval)
+        interval = min(interval * POLL_BACKOFF_FACTOR, maximum)
+
+
+async def wait_for_result(
+    result_url, headers, callback_token=None, deadline_seconds=POLL_DEADLINE_SECONDS
+):
+    """
+    Wait until a transcription is done or failed, or the deadline passes.
+
+    With a callback registered for callback_token, the result is only
+    fetched once the callback arrives (or at the slow fallback interval).
+    Returns the final result, whose status is "done" or "error".
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + deadline_seconds
+
+    if callback_token and GLADIA_CALLBACK_BASE_URL:
+        intervals = poll_intervals(
+            CALLBACK_FALLBACK_POLL_SECONDS, CALLBACK_FALLBACK_POLL_SECONDS
+        )
+        # registered again when a resumed job waits on a saved token
+        future = _callback_future(callback_token)
+    else:
+        intervals = poll_intervals()
+        future = None
+
+    try:
+        while True:
+            print("Polling for results...")
+            poll_response = await make_request(result_url, headers)
+            status = poll_response.get("status")
+            add_event("poll", status=status, callback=future is not None)
+
+            if status in ("done", "error"):
+                return poll_response
+
+            print("Transcription status:", status)
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return {
+                    "status": "error",
+                    "error": f"Transcription not finished after {deadline_seconds}s",
+                    "last_response": poll_response,
+                }
+
+            if future is not None and future.done():
+                # Callback already received, fall back to regular polling
+                future = None
+                intervals = poll_intervals()
+
+            delay = min(next(intervals), remaining)
+            if future is not None:
+                # Returns early as soon as the completion callback arrives
+                await asyncio.wait([future], timeout=delay)
+            else:
+                await asyncio.sleep(delay)
+    finally:
+        if callback_token:
+            _callbacks.pop(callback_token, None)
+
+
+async def make_request(url, headers, method="GET", data=None):
+    if method == "POST":
+        response = await send_request("POST", url, headers=headers, json=data)
+    else:
+        response = await send_request("GET", url, headers=headers)
+    return response.json()
+
+
+class MultipartFileStream:
+    """
+    multipart/form-data body that streams a single file from disk.
+
+    Only one chunk of the file is held in memory at a time, so uploading a
+    multi-gigabyte recording costs the same RSS as uploading a small one.
+    The body can be iterated again, which lets a failed upload be retried.
+    """
+
+    def __init__(
+        self,
+        field_name,
+        file_path,
+        content_type,
+        chunk_size=UPLOAD_CHUNK_SIZE,
+        progress_callback=None,
+    ):
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.progress_callback = progress_callback
+        self.boundary = uuid.uuid4().hex
+
+        file_name = os.path.basename(file_path)
+        self._head = (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field_name}"; filename="{file_name}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode()
+        self._tail = f"\r\n--{self.boundary}--\r\n".encode()
+        self.file_size = os.path.getsize(file_path)
+        self.total_size = len(self._head) + self.file_size + len(self._tail)
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def _report(self, sent):
+        if self.progress_callback:
+            self.progress_callback(sent, self.total_size)
+
+    async def __aiter__(self):
+        sent = len(self._head)
+        yield self._head
+        self._report(sent)
+
+        with open(self.file_path, "rb") as f:
+            while True:
+                # Disk reads run in a thread so the event loop never blocks
+                chunk = await asyncio.to_thread(f.read, self.chunk_size)
+                if not chunk:
+                    break
+                sent += len(chunk)
+                yield chunk
+                self._report(sent)
+
+        sent += len(self._tail)
+        yield self._tail
+        self._report(sent)
+
+
+async def upload_file(file_path, headers, content_type, progress_callback=None):
+    """
+    Upload a file to Gladia without loading it into memory.
+
+    progress_callback is called as progress_callback(bytes_sent, total_bytes)
+    after every chunk.
+    """
+    body = MultipartFileStream(
+        "audio", file_path, content_type, progress_callback=progress_callback
+    )
+
+    upload_headers = dict(headers)
+    upload_headers["Content-Type"] = body.content_type
+    upload_headers["Content-Length"] = str(body.total_size)
+
+    started = time.perf_counter()
+    response = await send_request(
+        "POST", f"{GLADIA_API_URL}/v2/upload/", headers=upload_headers, content=body
+    )
+    elapsed = time.perf_counter() - started
+    set_attributes(
+        bytes=body.total_size,
+        upload_seconds=round(elapsed, 3),
+        throughput_mbps=round(body.total_size * 8 / elapsed / 1e6, 2) if elapsed else None,
+    )
+    return response.json()
+
+
+async def transcribe(
+    file_path,
+    api_key,
+    diarization,
+    content_type,
+    progress_callback=None,
+    checkpoint=None,
+    source_path=None,
+    source_options=None,
+):
+    """
+    Upload a file, request its transcription and poll until it is finished.
+
+    Returns the last poll response, whose status is "done" or "error".
+    Finished results are cached, the same audio with the same options is
+    never uploaded twice; a file prepared from a recording is keyed by
+    source_path and the source_options it was prepared with. With a
+    checkpoint, the audio_url and result_url are saved as soon as Gladia
+    returns them and reused when resuming.
+    """
+    key = None
+    if TRANSCRIPT_CACHE:
+        key = await cache_key(
+            source_path or file_path,
+            diarization=diarization,
+            **(source_options or {}),
+        )
+        cached = load_result(key)
+        add_event("transcript_cache", hit=cached is not None)
+        if cached is not None:
+            print(f"- Transcription of {file_path} found in cache")
+            return cached
+
+    poll_response = await _transcribe(
+        file_path, api_key, diarization, content_type, progress_callback, checkpoint
+    )
+    if key and poll_response.get("status") == "done":
+        await asyncio.to_thread(save_result, key, poll_response)
+    return poll_response
+
+
+def _forget_upload(checkpoint):
+    """
+    Rewind a checkpoint to before the upload, so a retry uploads the audio
+    again instead of reusing an audio_url Gladia could not transcribe
+    """
+    if checkpoint is not None:
+        checkpoint.rewind(
+            "prepared", "audio_url", "result_url", "transcription_id", "callback_token"
+        )
+
+
+async def _transcribe(
+    file_path, api_key, diarization, content_type, progress_callback, checkpoint
+):
+    headers = {
+        "x-gladia-key": api_key,
+        "accept": "application/json",
+    }
+    audio_url = result_url = callback_token = None
+    if checkpoint is not None:
+        audio_url = checkpoint.get("audio_url")
+        result_url = checkpoint.get("result_url")
+        callback_token = checkpoint.get("callback_token")
+    add_event("resume", audio_url=bool(audio_url), result_url=bool(result_url))
+
+    if result_url:
+        print(f"- Resuming the transcription at {result_url}")
+    elif audio_url:
+        print(f"- Reusing the upload {audio_url}")
+    else:
+        print(f"- Uploading {file_path} to Gladia...")
+        with phase("upload"):
+            upload_response = await upload_file(
+                file_path, headers, content_type, progress_callback=progress_callback
+            )
+        print("Upload response with File ID:", upload_response)
+        audio_url = upload_response.get("audio_url")
+        if checkpoint is not None and audio_url:
+            checkpoint.update(stage="uploaded", audio_url=audio_url)
+
+    headers["Content-Type"] = "application/json"
+
+    if not result_url:
+        data = {
+            "audio_url": audio_url,
+            "diarization": diarization,
+        }
+        callback_token = None
+        if GLADIA_CALLBACK_BASE_URL:
+            callback_token = register_callback()
+            data["callback_url"] = (
+                f"{GLADIA_CALLBACK_BASE_URL}/gladia/callback?token={callback_token}"
+            )
+
+        print("- Sending request to Gladia API...")
+        try:
+            with span("gladia_request"):
+                response = await send_request(
+                    "POST",
+                    f"{GLADIA_API_URL}/v2/pre-recorded/",
+                    headers=headers,
+                    json=data,
+                )
+        except BaseException:
+            # the upload stays valid after a network failure
+            _callbacks.pop(callback_token, None)
+            raise
+        try:
+            post_response = response.json()
+        except ValueError:
+            post_response = {"status_code": response.status_code, "body": response.text}
+
+        print("Post response with Transcription ID:", post_response)
+        result_url = post_response.get("result_url")
+        transcription_id = post_response.get("id")
+
+        if not result_url:
+            _callbacks.pop(callback_token, None)
+            status_code = response.status_code
+            if status_code < 500 and status_code not in RETRY_STATUSES:
+                # Gladia rejected the request, not just failed to serve it:
+                # a retry uploads the audio again
+                _forget_upload(checkpoint)
+            return {"status": "error", "response": post_response}
+        if checkpoint is not None:
+            checkpoint.update(
+                stage="requested",
+                result_url=result_url,
+                transcription_id=transcription_id,
+                callback_token=callback_token,
+            )
+
+    with phase("transcription_wait"):
+        poll_response = await wait_for_result(result_url, headers, callback_token)
+
+    if poll_response.get("status") == "error" and "last_response" not in poll_response:
+        # Gladia failed this transcription: a retry uploads and requests it
+        # again, while a deadline hit keeps polling the same one
+        _forget_upload(checkpoint)
+    return poll_response
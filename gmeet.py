@@ -3,146 +3,261 @@ import os
 import subprocess
 import click
 import datetime
-import requests
 import json
+import signal
+import threading
 
-from time import sleep
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Optional
 
 import undetected_chromedriver as uc
 
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.by import By
 
-
-def make_request(url, headers, method="GET", data=None, files=None):
-    if method == "POST":
-        response = requests.post(url, headers=headers, json=data, files=files)
-    else:
-        response = requests.get(url, headers=headers)
-    return response.json()
-
-
-async def run_command_async(command):
+from audio import (
+    audio_content_type,
+    extract_audio,
+    preparation_options,
+    remap_transcript,
+    trim_silence,
+)
+from checkpoints import CHECKPOINT_FILE, Checkpoint
+from debug_capture import NO_CAPTURE, DebugCapture
+from gladia import transcribe
+from meeting_end import MeetingEndMonitor
+from metrics import phase, sample_recording
+from recording import RECORDING_MODE, build_record_command, has_video, recording_extension
+from sessions import restore_session, save_session
+from streaming import SegmentTranscriber, segment_output_args
+from transcript_formats import write_transcript_formats
+from tracing import TRACE_FILE, add_event, progress, span, trace_to
+from waits import absent, attribute_changed, clickable, visible, wait_for
+
+TRUTHY_VALUES = ["true", "t", "1", "yes", "y", "oui", "o"]
+
+# How often the recording time is reported to the job's followers
+RECORDING_PROGRESS_SECONDS = 5
+
+# Upper bounds for the condition-based waits of the sign-in and join flow
+STEP_TIMEOUT = int(os.getenv("JOIN_STEP_TIMEOUT_SECONDS", 10))
+SIGN_IN_TIMEOUT = int(os.getenv("SIGN_IN_TIMEOUT_SECONDS", 15))
+PREJOIN_TIMEOUT = int(os.getenv("PREJOIN_TIMEOUT_SECONDS", 20))
+CLICK_TIMEOUT = 2
+JOIN_RETRY_TIMEOUT = 5
+JOIN_RETRY_INTERVAL = 1
+
+# Google Meet page elements
+POPUP_BUTTON_XPATH = "/html/body/div/div[3]/div[2]/div/div/div/div/div[2]/div/div[1]/button"
+MISSING_MIC_CLASS = "VfPpkd-vQzf8d"
+MIC_TOGGLE_XPATH = '//*[@id="yDmH0d"]/c-wiz/div/div/div[14]/div[3]/div/div[2]/div[4]/div/div/div[1]/div[1]/div/div[6]/div[1]/div/div'
+CAMERA_TOGGLE_XPATH = '//*[@id="yDmH0d"]/c-wiz/div/div/div[14]/div[3]/div/div[2]/div[4]/div/div/div[1]/div[1]/div/div[6]/div[2]/div'
+NAME_INPUT_XPATH = '//*[@id="yDmH0d"]/c-wiz/div/div/div[14]/div[3]/div/div[2]/div[4]/div/div/div[2]/div[1]/div[1]/div[3]/label/input'
+NAME_INPUT_FOCUSED_XPATH = '//*[@id="yDmH0d"]/c-wiz/div/div/div[14]/div[3]/div/div[2]/div/div/div[2]/div[1]/div[1]/div[3]/label/input'
+ASK_TO_JOIN_XPATH = '//*[@id="yDmH0d"]/c-wiz/div/div/div[14]/div[3]/div/div[2]/div[4]/div/div/div[2]/div[1]/div[2]/div[1]/div[1]/button/span'
+JOIN_NOW_XPATH = '//*[@id="yDmH0d"]/c-wiz/div/div/div[14]/div[3]/div/div[2]/div[4]/div/div/div[2]/div[1]/div[2]/div[1]/div[1]/button'
+IN_MEETING_POPUP_XPATH = "/html/body/div[1]/div[3]/span/div[2]/div/div/div[2]/div[1]/button"
+MENU_ITEM_CLASS = "V4jiNc.VfPpkd-StrnGf-rymPhb-ibnC6b"
+
+_virtual_audio_ready = False
+_launch_lock = threading.Lock()
+
+
+async def run_command_async(command, on_start=None):
+    # own process group, so signals reach ffmpeg and not only the shell
     process = await asyncio.create_subprocess_shell(
-        command, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True,
     )
+    if on_start:
+        on_start(process)
 
     # Wait for the process to complete
-    stdout, stderr = await process.communicate()
+    try:
+        stdout, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        # don't leave ffmpeg running on a slot another job will reuse
+        if process.returncode is None:
+            os.killpg(process.pid, signal.SIGTERM)
+        raise
 
     return stdout, stderr
 
 
-async def google_sign_in(email, password, driver):
+def stop_recording(process):
+    """
+    Stop an ffmpeg started by run_command_async like a "q" keypress: it
+    flushes its outputs, so the MP4 gets its index and stays playable
+    """
+    if process.returncode is None:
+        try:
+            os.killpg(process.pid, signal.SIGINT)
+        except ProcessLookupError:
+            pass
+
+
+@contextmanager
+def launch_environment(display=None, audio_sink=None):
+    """
+    Temporarily point DISPLAY and PULSE_SINK at a recording slot.
+
+    Chrome inherits the environment it is started with, so this is held
+    for the duration of the launch only, behind a lock.
+    """
+    overrides = {"DISPLAY": display, "PULSE_SINK": audio_sink}
+    with _launch_lock:
+        previous = {name: os.environ.get(name) for name in overrides}
+        for name, value in overrides.items():
+            if value:
+                os.environ[name] = value
+        try:
+            yield
+        finally:
+            for name, value in previous.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+
+def launch_browser(log_path="chromedriver.log", display=None, audio_sink=None):
+    options = uc.ChromeOptions()
+
+    options.add_argument("--use-fake-ui-for-media-stream")
+    options.add_argument("--window-size=1920x1080")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-setuid-sandbox")
+    # options.add_argument('--headless=new')
+    options.add_argument("--disable-gpu")
+    options.add_argument("--disable-extensions")
+    options.add_argument("--disable-application-cache")
+    options.add_argument("--disable-setuid-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+
+    with launch_environment(display, audio_sink):
+        driver = uc.Chrome(
+            service_log_path=log_path, use_subprocess=False, options=options
+        )
+
+    driver.set_window_size(1920, 1080)
+    return driver
+
+
+async def google_sign_in(email, password, driver, capture=NO_CAPTURE):
     # Open the Google Sign-In page
     driver.get("https://accounts.google.com")
 
-    sleep(1)
     # Find the email input field and enter the email
-    email_field = driver.find_element(By.NAME, "identifier")
+    email_field = await wait_for(
+        lambda: visible(driver, By.NAME, "identifier"),
+        STEP_TIMEOUT,
+        "the email input",
+        required=True,
+    )
     email_field.send_keys(email)
+    add_event("sign_in_step", step="email")
     # save screenshot
-    driver.save_screenshot("screenshots/email.png")
+    capture.snapshot(driver, "email")
 
     # Click the Next button
-    # next_button = driver.find_element_by_id("identifierNext")
-    sleep(2)
-
-    driver.find_element(By.ID, "identifierNext").click()
-
-    # Wait for a moment to let the next page load
-    sleep(3)
+    next_button = await wait_for(
+        lambda: clickable(driver, By.ID, "identifierNext"),
+        STEP_TIMEOUT,
+        "the next button",
+        required=True,
+    )
+    next_button.click()
+
+    # Wait for the password page to load
+    password_field = await wait_for(
+        lambda: clickable(driver, By.NAME, "Passwd"),
+        STEP_TIMEOUT,
+        "the password input",
+        required=True,
+    )
 
     # save screenshot
-    driver.save_screenshot("screenshots/password.png")
+    capture.snapshot(driver, "password")
 
-    # Find the password input field and enter the password
-    password_field = driver.find_element(By.NAME, "Passwd")
+    # Enter the password
     password_field.click()
     password_field.send_keys(password)
 
     # Press the Enter key to submit the form
     password_field.send_keys(Keys.RETURN)
+    add_event("sign_in_step", step="password")
 
     # Wait for the login process to complete
-    sleep(5)
+    await wait_for(lambda: absent(driver, By.NAME, "Passwd"), SIGN_IN_TIMEOUT)
     # save screenshot
-    driver.save_screenshot("screenshots/signed_in.png")
-
+    capture.snapshot(driver, "signed_in")
+
+
+async def sign_in(email, password, driver, capture=NO_CAPTURE):
+    """
+    Reuse the account's saved Google session, and only go through the
+    password flow when there is none or it has expired.
+    """
+    with span("restore_session") as current:
+        restored = await restore_session(driver, email)
+        if current is not None:
+            current.attributes["restored"] = restored
+    if restored:
+        print("Reusing saved Google session")
+        return
 
-async def join_meet():
-    meet_link = os.getenv("GMEET_LINK", "https://meet.google.com/dau-pztc-yad")
-    print(f"start recorder for {meet_link}")
+    print("Google Sign in")
+    with span("google_sign_in"):
+        await google_sign_in(email, password, driver, capture)
 
-    # delete the folder screenshots if it exists even if not empty
-    print("Cleaning screenshots")
-    if os.path.exists("screenshots"):
-        # for each file in the folder delete it
-        for f in os.listdir("screenshots"):
-            os.remove(f"screenshots/{f}")
+    if "myaccount.google.com" in driver.current_url:
+        save_session(driver, email)
     else:
-        os.mkdir("screenshots")
-
-    print("starting virtual audio drivers")
-    # find audio source for specified browser
-    subprocess.check_output(
-        "sudo rm -rf /var/run/pulse /var/lib/pulse /root/.config/pulse", shell=True
-    )
-    subprocess.check_output(
-        "sudo pulseaudio -D --verbose --exit-idle-time=-1 --system --disallow-exit  >> /dev/null 2>&1",
-        shell=True,
-    )
-    subprocess.check_output(
-        'sudo pactl load-module module-null-sink sink_name=DummyOutput sink_properties=device.description="Virtual_Dummy_Output"',
-        shell=True,
-    )
-    subprocess.check_output(
-        'sudo pactl load-module module-null-sink sink_name=MicOutput sink_properties=device.description="Virtual_Microphone_Output"',
-        shell=True,
+        print(f"Sign in ended on {driver.current_url}, session not saved")
+
+
+def more_options_buttons(driver):
+    return [
+        element
+        for element in driver.find_elements(By.CLASS_NAME, "VfPpkd-Bz112c-LgbsSe")
+        if element.get_attribute("aria-label") == "More options"
+    ]
+
+
+def prejoin_ready(driver):
+    """
+    True once the pre-join screen shows its controls or the missing mic dialog
+    """
+    return (
+        driver.find_elements(By.CLASS_NAME, MISSING_MIC_CLASS)
+        or visible(driver, By.XPATH, MIC_TOGGLE_XPATH)
+        or visible(driver, By.XPATH, JOIN_NOW_XPATH)
+        or visible(driver, By.XPATH, NAME_INPUT_XPATH)
     )
-    subprocess.check_output(
-        "sudo pactl set-default-source MicOutput.monitor", shell=True
-    )
-    subprocess.check_output("sudo pactl set-default-sink MicOutput", shell=True)
-    subprocess.check_output(
-        "sudo pactl load-module module-virtual-source source_name=VirtualMic",
-        shell=True,
-    )
-
-    options = uc.ChromeOptions()
-
-    options.add_argument("--use-fake-ui-for-media-stream")
-    options.add_argument("--window-size=1920x1080")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-setuid-sandbox")
-    # options.add_argument('--headless=new')
-    options.add_argument("--disable-gpu")
-    options.add_argument("--disable-extensions")
-    options.add_argument("--disable-application-cache")
-    options.add_argument("--disable-setuid-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    log_path = "chromedriver.log"
-
-    driver = uc.Chrome(service_log_path=log_path, use_subprocess=False, options=options)
-
-    driver.set_window_size(1920, 1080)
 
-    email = os.getenv("GMAIL_USER_EMAIL", "")
-    password = os.getenv("GMAIL_USER_PASSWORD", "")
-    gladia_api_key = (os.getenv("GLADIA_API_KEY", ""),)
 
-    if email == "" or password == "":
-        print("No email or password specified")
-        return
+async def click_toggle(element):
+    """
+    Click a mic/camera toggle and wait for Meet to flip its state
+    """
+    previous = element.get_attribute("data-is-muted")
+    element.click()
+    await wait_for(
+        lambda: attribute_changed(element, "data-is-muted", previous), CLICK_TIMEOUT
+    )
 
-    if gladia_api_key == "":
-        print("No Gladia API key specified")
-        print("Create one for free at https://app.gladia.io/")
-        return
 
-    print("Google Sign in")
-    await google_sign_in(email, password, driver)
+async def join_call(
+    driver, meet_link, custom_name, max_wait_minutes, capture=NO_CAPTURE
+):
+    """
+    Go through the Meet pre-join screen and wait until the bot is in the call.
 
+    Returns True once joined, False if max_wait_minutes elapsed first.
+    """
     driver.get(meet_link)
 
     driver.execute_cdp_cmd(
@@ -159,161 +274,155 @@ async def join_meet():
         },
     )
 
-    print("screenshot")
-    driver.save_screenshot("screenshots/initial.png")
-    print("Done save initial")
+    capture.snapshot(driver, "initial")
 
     try:
-        driver.find_element(
-            By.XPATH,
-            "/html/body/div/div[3]/div[2]/div/div/div/div/div[2]/div/div[1]/button",
-        ).click()
-        sleep(2)
+        driver.find_element(By.XPATH, POPUP_BUTTON_XPATH).click()
+        add_event("click", target="popup", outcome="clicked")
+        await wait_for(
+            lambda: absent(driver, By.XPATH, POPUP_BUTTON_XPATH), CLICK_TIMEOUT
+        )
     except:
+        add_event("click", target="popup", outcome="missing")
         print("No popup")
 
     # disable microphone
     print("Disable microphone")
 
-    sleep(10)
+    # wait for the pre-join screen to render instead of a fixed delay
+    await wait_for(lambda: prejoin_ready(driver), PREJOIN_TIMEOUT)
     missing_mic = False
 
     try:
         print("Try to dismiss missing mic")
-        driver.find_element(By.CLASS_NAME, "VfPpkd-vQzf8d").find_element(By.XPATH, "..")
-        sleep(2)
-        # take screenshot
-
-        driver.save_screenshot("screenshots/missing_mic.png")
-
-        # save the webpage source html
-        with open("screenshots/webpage.html", "w") as f:
-            f.write(driver.page_source)
+        driver.find_element(By.CLASS_NAME, MISSING_MIC_CLASS).find_element(By.XPATH, "..")
+        # take screenshot, with the webpage source html
+        capture.snapshot(driver, "missing_mic", page_source=True)
 
         missing_mic = True
     except:
         pass
+    add_event("missing_mic", found=missing_mic)
 
     try:
         print("Allow Microphone")
-        driver.find_element(
-            By.XPATH,
-            "/html/body/div/div[3]/div[2]/div/div/div/div/div[2]/div/div[1]/button",
-        ).click()
-        sleep(2)
+        driver.find_element(By.XPATH, POPUP_BUTTON_XPATH).click()
+        add_event("click", target="allow_microphone", outcome="clicked")
+        await wait_for(
+            lambda: absent(driver, By.XPATH, POPUP_BUTTON_XPATH), CLICK_TIMEOUT
+        )
         # take screenshot
-        driver.save_screenshot("screenshots/allow_microphone.png")
+        capture.snapshot(driver, "allow_microphone")
         print("Done save allow microphone")
     except:
+        add_event("click", target="allow_microphone", outcome="missing")
         print("No Allow Microphone popup")
 
     # if not missing_mic:
     try:
         print("Try to disable microphone")
-        driver.find_element(
-            By.XPATH,
-            '//*[@id="yDmH0d"]/c-wiz/div/div/div[14]/div[3]/div/div[2]/div[4]/div/div/div[1]/div[1]/div/div[6]/div[1]/div/div',
-        ).click()
+        await click_toggle(driver.find_element(By.XPATH, MIC_TOGGLE_XPATH))
+        add_event("click", target="microphone", outcome="clicked")
     except:
+        add_event("click", target="microphone", outcome="missing")
         print("No microphone to disable")
 
-    sleep(2)
-
-    driver.save_screenshot("screenshots/disable_microphone.png")
+    capture.snapshot(driver, "disable_microphone")
     print("Done save microphone")
 
     # disable microphone
     print("Disable camera")
     if not missing_mic:
-        driver.find_element(
-            By.XPATH,
-            '//*[@id="yDmH0d"]/c-wiz/div/div/div[14]/div[3]/div/div[2]/div[4]/div/div/div[1]/div[1]/div/div[6]/div[2]/div',
-        ).click()
-        sleep(2)
+        await click_toggle(driver.find_element(By.XPATH, CAMERA_TOGGLE_XPATH))
+        add_event("click", target="camera", outcome="clicked")
     else:
         print("assuming missing mic = missing camera")
-    driver.save_screenshot("screenshots/disable_camera.png")
+    capture.snapshot(driver, "disable_camera")
     print("Done save camera")
     try:
-        driver.find_element(
-            By.XPATH,
-            '//*[@id="yDmH0d"]/c-wiz/div/div/div[14]/div[3]/div/div[2]/div[4]/div/div/div[2]/div[1]/div[1]/div[3]/label/input',
-        ).click()
-        sleep(2)
-
-        custom_name = os.getenv("CUSTOM_NAME", "TEST")
-        driver.find_element(
-            By.XPATH,
-            '//*[@id="yDmH0d"]/c-wiz/div/div/div[14]/div[3]/div/div[2]/div/div/div[2]/div[1]/div[1]/div[3]/label/input',
-        ).send_keys(custom_name)
-        sleep(2)
-        driver.save_screenshot("screenshots/give_non_registered_name.png")
+        driver.find_element(By.XPATH, NAME_INPUT_XPATH).click()
+
+        name_input = await wait_for(
+            lambda: visible(driver, By.XPATH, NAME_INPUT_FOCUSED_XPATH),
+            STEP_TIMEOUT,
+            "the name input",
+            required=True,
+        )
+        name_input.send_keys(custom_name)
+        capture.snapshot(driver, "give_non_registered_name")
 
         print("Done save name")
-        sleep(5)
-        driver.find_element(
-            By.XPATH,
-            '//*[@id="yDmH0d"]/c-wiz/div/div/div[14]/div[3]/div/div[2]/div[4]/div/div/div[2]/div[1]/div[2]/div[1]/div[1]/button/span',
-        ).click()
-        sleep(5)
+        ask_to_join = await wait_for(
+            lambda: clickable(driver, By.XPATH, ASK_TO_JOIN_XPATH),
+            STEP_TIMEOUT,
+            "the ask to join button",
+            required=True,
+        )
+        ask_to_join.click()
+        add_event("click", target="ask_to_join", outcome="clicked")
     except:
+        add_event("click", target="ask_to_join", outcome="missing")
         print("authentification already done")
-        sleep(5)
+        join_now = await wait_for(
+            lambda: clickable(driver, By.XPATH, JOIN_NOW_XPATH), STEP_TIMEOUT
+        )
         # take screenshot
-        driver.save_screenshot("screenshots/authentification_already_done.png")
+        capture.snapshot(driver, "authentification_already_done")
         print(driver.title)
 
-        driver.find_element(
-            By.XPATH,
-            '//*[@id="yDmH0d"]/c-wiz/div/div/div[14]/div[3]/div/div[2]/div[4]/div/div/div[2]/div[1]/div[2]/div[1]/div[1]/button',
-        ).click()
-        sleep(5)
-
-    # try every 5 seconds for a maximum of 5 minutes
-    # current date and time
-    now = datetime.datetime.now()
-    max_time = now + datetime.timedelta(
-        minutes=os.getenv("MAX_WAITING_TIME_IN_MINUTES", 5)
+        if join_now is None:
+            # let selenium raise its usual error for the missing button
+            join_now = driver.find_element(By.XPATH, JOIN_NOW_XPATH)
+        join_now.click()
+        add_event("click", target="join_now", outcome="clicked")
+
+    # retry until we are admitted, for a maximum of max_wait_minutes
+    max_time = datetime.datetime.now() + datetime.timedelta(
+        minutes=int(max_wait_minutes)
     )
 
     joined = False
 
-    while now < max_time and not joined:
-        driver.save_screenshot("screenshots/joined.png")
+    while datetime.datetime.now() < max_time and not joined:
+        capture.snapshot(driver, "joined")
         print("Done save joined")
-        sleep(5)
+
+        # the in-call toolbar only shows up once we have been admitted
+        await wait_for(lambda: more_options_buttons(driver), JOIN_RETRY_TIMEOUT)
 
         try:
-            driver.find_element(
-                By.XPATH,
-                "/html/body/div[1]/div[3]/span/div[2]/div/div/div[2]/div[1]/button",
-            ).click()
+            driver.find_element(By.XPATH, IN_MEETING_POPUP_XPATH).click()
+            add_event("click", target="in_meeting_popup", outcome="clicked")
 
-            driver.save_screenshot("screenshots/remove_popup.png")
+            capture.snapshot(driver, "remove_popup")
             print("Done save popup in meeting")
         except:
+            add_event("click", target="in_meeting_popup", outcome="missing")
             print("No popup in meeting")
 
         print("Try to click expand options")
-        elements = driver.find_elements(By.CLASS_NAME, "VfPpkd-Bz112c-LgbsSe")
         expand_options = False
-        for element in elements:
-            if element.get_attribute("aria-label") == "More options":
-                try:
-                    element.click()
-                    expand_options = True
-                    print("Expand options clicked")
-                except:
-                    print("Not able to click expand options")
-
-        driver.save_screenshot("screenshots/expand_options.png")
-
-        sleep(2)
+        for element in more_options_buttons(driver):
+            try:
+                element.click()
+                expand_options = True
+                print("Expand options clicked")
+                add_event("click", target="more_options", outcome="clicked")
+            except:
+                add_event("click", target="more_options", outcome="failed")
+                print("Not able to click expand options")
+
+        capture.snapshot(driver, "expand_options")
+
         print("Try to move to full screen")
 
         if expand_options:
-            li_elements = driver.find_elements(
-                By.CLASS_NAME, "V4jiNc.VfPpkd-StrnGf-rymPhb-ibnC6b"
+            li_elements = (
+                await wait_for(
+                    lambda: driver.find_elements(By.CLASS_NAME, MENU_ITEM_CLASS),
+                    CLICK_TIMEOUT,
+                )
+                or []
             )
             for li_element in li_elements:
                 txt = li_element.text.strip().lower()
@@ -334,103 +443,470 @@ async def join_meet():
                 else:
                     pass
 
-        driver.save_screenshot("screenshots/full_screen.png")
+        capture.snapshot(driver, "full_screen")
         print("Done save full screen")
 
-    duration = os.getenv("DURATION_IN_MINUTES", 15)
-    duration = int(duration) * 60
-
-    print("Start recording")
-    record_command = f"ffmpeg -y -video_size 1920x1080 -framerate 30 -f x11grab -i :99 -f pulse -i default -t {duration} -c:v libx264 -pix_fmt yuv420p -c:a aac -strict experimental recordings/output.mp4"
+        add_event("admission_check", joined=joined)
+        if not joined:
+            await asyncio.sleep(JOIN_RETRY_INTERVAL)
+
+    return joined
+
+
+@dataclass
+class MeetConfig:
+    """
+    Everything a single recording job needs, so jobs never share state
+    through os.environ or fixed paths.
+    """
+
+    meet_link: str
+    email: str
+    password: str
+    gladia_api_key: str
+    duration_minutes: int = 15
+    max_wait_time_minutes: int = 5
+    diarization: bool = False
+    custom_name: str = "TEST"
+    streaming_transcription: bool = False
+    # "audio", "low_fps" or "full", see recording.py
+    recording_mode: str = "full"
+    # encoding profile of "full" recordings, None for ENCODING_PROFILE
+    encoding_profile: Optional[str] = None
+    # every file produced by the job is written under these directories
+    output_dir: str = "recordings"
+    screenshots_dir: str = "screenshots"
+    # X display and PulseAudio sink of the recording slot, None for default
+    display: str = ":99"
+    audio_sink: Optional[str] = None
+    # stop before duration_minutes once the meeting is over, see meeting_end.py
+    stop_on_meeting_end: bool = True
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            meet_link=os.getenv("GMEET_LINK", "https://meet.google.com/dau-pztc-yad"),
+            email=os.getenv("GMAIL_USER_EMAIL", ""),
+            password=os.getenv("GMAIL_USER_PASSWORD", ""),
+            gladia_api_key=os.getenv("GLADIA_API_KEY", ""),
+            duration_minutes=int(os.getenv("DURATION_IN_MINUTES", 15)),
+            max_wait_time_minutes=int(os.getenv("MAX_WAITING_TIME_IN_MINUTES", 5)),
+            diarization=str(os.getenv("DIARIZATION")).lower() in TRUTHY_VALUES,
+            custom_name=os.getenv("CUSTOM_NAME", "TEST"),
+            streaming_transcription=str(os.getenv("STREAMING_TRANSCRIPTION")).lower()
+            in TRUTHY_VALUES,
+            recording_mode=RECORDING_MODE,
+            stop_on_meeting_end=os.getenv("MEETING_END_DETECTION", "true").lower()
+            in TRUTHY_VALUES,
+        )
+
+    @classmethod
+    def for_job(cls, job_id, **kwargs):
+        """
+        Config writing into an isolated recordings/<job_id> workspace
+        """
+        output_dir = os.path.join("recordings", job_id)
+        return cls(
+            output_dir=output_dir,
+            screenshots_dir=os.path.join(output_dir, "screenshots"),
+            **kwargs,
+        )
+
+    @classmethod
+    def from_checkpoint(cls, checkpoint):
+        """
+        Config of the job a checkpoint was saved by, enough to resume it
+        """
+        return cls(password="", **checkpoint.get("config"))
+
+    def resumable(self):
+        """
+        The config saved in the checkpoint, without the Google password
+        """
+        fields = asdict(self)
+        del fields["password"]
+        return fields
+
+    @property
+    def recording_path(self):
+        return os.path.join(
+            self.output_dir, f"output.{recording_extension(self.recording_mode)}"
+        )
+
+    @property
+    def transcript_path(self):
+        return os.path.join(self.output_dir, "transcript.json")
+
+    @property
+    def error_path(self):
+        return os.path.join(self.output_dir, "error.json")
+
+    @property
+    def trace_path(self):
+        return os.path.join(self.output_dir, TRACE_FILE)
+
+    @property
+    def checkpoint_path(self):
+        return os.path.join(self.output_dir, CHECKPOINT_FILE)
+
+    @property
+    def segment_dir(self):
+        return os.path.join(self.output_dir, "segments")
+
+    @property
+    def audio_source(self):
+        return f"{self.audio_sink}.monitor" if self.audio_sink else "default"
+
+
+def setup_virtual_audio():
+    """
+    Start PulseAudio with the virtual sinks, once per process.
+
+    Restarting the daemon for every job would cut the audio of the
+    recordings already running.
+    """
+    global _virtual_audio_ready
+    if _virtual_audio_ready:
+        return
 
-    await asyncio.gather(
-        run_command_async(record_command),
+    print("starting virtual audio drivers")
+    # find audio source for specified browser
+    subprocess.check_output(
+        "sudo rm -rf /var/run/pulse /var/lib/pulse /root/.config/pulse", shell=True
+    )
+    subprocess.check_output(
+        "sudo pulseaudio -D --verbose --exit-idle-time=-1 --system --disallow-exit  >> /dev/null 2>&1",
+        shell=True,
+    )
+    subprocess.check_output(
+        'sudo pactl load-module module-null-sink sink_name=DummyOutput sink_properties=device.description="Virtual_Dummy_Output"',
+        shell=True,
+    )
+    subprocess.check_output(
+        'sudo pactl load-module module-null-sink sink_name=MicOutput sink_properties=device.description="Virtual_Microphone_Output"',
+        shell=True,
+    )
+    subprocess.check_output(
+        "sudo pactl set-default-source MicOutput.monitor", shell=True
+    )
+    subprocess.check_output("sudo pactl set-default-sink MicOutput", shell=True)
+    subprocess.check_output(
+        "sudo pactl load-module module-virtual-source source_name=VirtualMic",
+        shell=True,
     )
+    _virtual_audio_ready = True
+
+
+async def join_meet(
+    config,
+    progress_callback=None,
+    joined_callback=None,
+    browser_pool=None,
+    listener=None,
+):
+    """
+    Record and transcribe a meeting, tracing every step into the job's
+    trace.jsonl; listener gets them live, see tracing.trace_to.
+    """
+    with trace_to(config.trace_path, listener=listener), span(
+        "join_meet",
+        meet_link=config.meet_link,
+        display=config.display,
+        streaming_transcription=config.streaming_transcription,
+    ):
+        return await record_meeting(
+            config, progress_callback, joined_callback, browser_pool
+        )
+
+
+async def resume_meeting(config, progress_callback=None, listener=None):
+    """
+    Finish a job from the last stage its checkpoint reached, without
+    recording the meeting again. The spans are added to the job's trace.
+    """
+    with trace_to(config.trace_path, append=True, listener=listener), span(
+        "resume_meeting"
+    ):
+        checkpoint = Checkpoint(config.checkpoint_path)
+        if not checkpoint.reached("recorded"):
+            raise ValueError("The meeting was not recorded, nothing to resume")
+        add_event("resume", stage=checkpoint.stage)
+        print(f"Resuming {config.output_dir} after stage {checkpoint.stage}")
+        if checkpoint.reached("transcribed") and os.path.exists(config.transcript_path):
+            return
+
+        poll_response = await transcribe_recording(config, checkpoint, progress_callback)
+        save_transcript(config, checkpoint, poll_response)
+
+
+async def record_meeting(
+    config, progress_callback=None, joined_callback=None, browser_pool=None
+):
+    started_at = datetime.datetime.now()
+    print(f"start recorder for {config.meet_link}")
+
+    if config.email == "" or config.password == "":
+        print("No email or password specified")
+        return
+
+    if config.gladia_api_key == "":
+        print("No Gladia API key specified")
+        print("Create one for free at https://app.gladia.io/")
+        return
+
+    os.makedirs(config.output_dir, exist_ok=True)
+
+    # every completed stage is saved here, see resume_meeting
+    checkpoint = Checkpoint(config.checkpoint_path)
+    checkpoint.reset(config=config.resumable())
+
+    # delete the folder screenshots if it exists even if not empty
+    print("Cleaning screenshots")
+    if os.path.exists(config.screenshots_dir):
+        # for each file in the folder delete it
+        for f in os.listdir(config.screenshots_dir):
+            os.remove(os.path.join(config.screenshots_dir, f))
+    else:
+        os.makedirs(config.screenshots_dir)
+
+    setup_virtual_audio()
+
+    # screenshots of the sign-in and join steps, written only if they fail
+    capture = DebugCapture(config.screenshots_dir)
+
+    if browser_pool is not None:
+        # signed-in browser from the warm pool, or a fresh one
+        browser = await browser_pool.acquire(config, capture)
+        driver = browser.driver
+    else:
+        with phase("browser_launch"):
+            driver = launch_browser(
+                os.path.join(config.output_dir, "chromedriver.log"),
+                config.display,
+                config.audio_sink,
+            )
+
+    try:
+        try:
+            if browser_pool is None:
+                with phase("sign_in"):
+                    await sign_in(config.email, config.password, driver, capture)
+
+            with phase("join_wait"):
+                joined = await join_call(
+                    driver,
+                    config.meet_link,
+                    config.custom_name,
+                    config.max_wait_time_minutes,
+                    capture,
+                )
+        except Exception as e:
+            capture.finish(failed=True, reason=f"Join failed: {e!r}")
+            raise
+        capture.finish(failed=not joined, reason="Not admitted in time")
+
+        if joined:
+            time_to_join = (datetime.datetime.now() - started_at).total_seconds()
+            print(f"Joined the meeting in {time_to_join:.1f}s")
+            if joined_callback:
+                joined_callback(time_to_join)
+        else:
+            print("Not admitted before the maximum waiting time, recording anyway")
+
+        duration = int(config.duration_minutes) * 60
+        diarization = "true" if config.diarization else "false"
+
+        print(f"Start recording ({config.recording_mode})")
+        record_command, audio_input = build_record_command(
+            config.recording_mode,
+            config.display,
+            config.audio_source,
+            duration,
+            config.recording_path,
+            config.encoding_profile,
+        )
+
+        segment_transcriber = None
+        if config.streaming_transcription:
+            # cut the audio into rolling segments transcribed while recording
+            segment_dir = config.segment_dir
+            os.makedirs(segment_dir, exist_ok=True)
+            for f in os.listdir(segment_dir):
+                os.remove(os.path.join(segment_dir, f))
+            record_command += " " + segment_output_args(
+                segment_dir, duration, audio_input=audio_input
+            )
+            segment_transcriber = SegmentTranscriber(
+                segment_dir, config.gladia_api_key, diarization
+            )
+
+        # ffmpeg CPU and Chrome memory are sampled and the recording time is
+        # reported while recording, and the meeting is watched so the
+        # recording stops when it is over
+        watchers = []
+
+        async def stop_when_meeting_ends(process):
+            monitor = MeetingEndMonitor(driver, config.audio_source)
+            reason = await monitor.wait_for_end()
+            print(f"Stopping the recording early: {reason}")
+            add_event("meeting_end", reason=reason)
+            stop_recording(process)
+
+        async def report_recording_time():
+            started = asyncio.get_running_loop().time()
+            while True:
+                elapsed = asyncio.get_running_loop().time() - started
+                progress(
+                    "recording", elapsed_seconds=int(elapsed), duration_seconds=duration
+                )
+                await asyncio.sleep(RECORDING_PROGRESS_SECONDS)
+
+        def start_watchers(process):
+            watchers.append(asyncio.create_task(report_recording_time()))
+            watchers.append(
+                asyncio.create_task(
+                    sample_recording(
+                        config.display, process.pid, getattr(driver, "browser_pid", None)
+                    )
+                )
+            )
+            if config.stop_on_meeting_end:
+                watchers.append(asyncio.create_task(stop_when_meeting_ends(process)))
+
+        with phase("recording"):
+            recording = asyncio.ensure_future(
+                run_command_async(record_command, on_start=start_watchers)
+            )
+            try:
+                if segment_transcriber:
+                    await segment_transcriber.watch(recording)
+                await recording
+            except BaseException:
+                # no segment is transcribed for a recording that failed
+                if segment_transcriber:
+                    await segment_transcriber.close()
+                raise
+            finally:
+                for watcher in watchers:
+                    watcher.cancel()
+                # stopped before the browser is released or quit
+                await asyncio.gather(*watchers, return_exceptions=True)
+    finally:
+        # leave the meeting and free the browser
+        if browser_pool is not None:
+            await browser_pool.release(browser)
+        else:
+            driver.quit()
 
     print("Done recording")
+    recording_done_at = datetime.datetime.now()
     print("Transcribing using Gladia")
 
-    file_path = "recordings/output.mp4"  # Change with your file path
+    file_path = config.recording_path
 
     if os.path.exists(file_path):  # This is here to check if the file exists
         print("- File exists")
+        checkpoint.update(stage="recorded", recording_path=file_path)
     else:
         print("- File does not exist")
 
-    file_name, file_extension = os.path.splitext(
-        file_path
-    )  # Get your audio file name + extension
-
-    if str(os.getenv("DIARIZATION")).lower() in [
-        "true",
-        "t",
-        "1",
-        "yes",
-        "y",
-        "oui",
-        "o",
-    ]:
-        diarization = "true"
+    if segment_transcriber:
+        print("- Waiting for the last segments...")
+        try:
+            poll_response = await segment_transcriber.finish()
+        finally:
+            await segment_transcriber.close()
     else:
-        diarization = "false"
-
-    with open(file_path, "rb") as f:  # Open the file
-        file_content = f.read()  # Read the content of the file
+        poll_response = await transcribe_recording(config, checkpoint, progress_callback)
 
-    headers = {
-        "x-gladia-key": os.getenv("GLADIA_API_KEY", ""),
-        "accept": "application/json",
-    }
+    save_transcript(config, checkpoint, poll_response)
 
-    files = [("audio", (file_path, file_content, "video/" + file_extension[1:]))]
+    time_to_transcript = (datetime.datetime.now() - recording_done_at).total_seconds()
+    print(f"- Transcript ready {time_to_transcript:.1f}s after end of recording")
 
-    print("- Uploading file to Gladia...")
-    upload_response = make_request(
-        "https://api.gladia.io/v2/upload/", headers, "POST", files=files
-    )
-    print("Upload response with File ID:", upload_response)
-    audio_url = upload_response.get("audio_url")
+    print("- End of work")
 
-    data = {
-        "audio_url": audio_url,
-        "diarization": diarization,
-    }
 
-    headers["Content-Type"] = "application/json"
+async def transcribe_recording(config, checkpoint, progress_callback=None):
+    """
+    Prepare the recorded audio for upload and transcribe it, skipping the
+    stages the checkpoint already completed
+    """
+    diarization = "true" if config.diarization else "false"
 
-    print("- Sending request to Gladia API...")
-    post_response = make_request(
-        "https://api.gladia.io/v2/pre-recorded/", headers, "POST", data=data
+    upload_path = checkpoint.get("upload_path")
+    if checkpoint.reached("prepared") and upload_path and os.path.exists(upload_path):
+        offsets = checkpoint.get("offsets")
+    else:
+        file_path = config.recording_path
+        if has_video(config.recording_mode):
+            # Only the audio track is needed for transcription, the MP4 stays local
+            print("- Extracting audio track...")
+            with phase("audio_extract"):
+                upload_path = await extract_audio(file_path)
+        else:
+            # audio-only recordings are already in the upload format
+            upload_path = file_path
+
+        # long silences are not uploaded, timestamps are mapped back after
+        with phase("silence_trim"):
+            upload_path, offsets = await trim_silence(upload_path)
+
+        # an upload of other audio can't be reused
+        checkpoint.update(
+            stage="prepared",
+            upload_path=upload_path,
+            offsets=offsets,
+            audio_url=None,
+            result_url=None,
+            transcription_id=None,
+            callback_token=None,
+        )
+
+    # cached results are keyed by the recording: the re-encoded upload is
+    # not byte for byte the same from one run to the next
+    source_path = source_options = None
+    if os.path.exists(config.recording_path):
+        source_path = config.recording_path
+        source_options = preparation_options(extract=has_video(config.recording_mode))
+
+    poll_response = await transcribe(
+        upload_path,
+        config.gladia_api_key,
+        diarization,
+        audio_content_type(upload_path),
+        progress_callback=progress_callback,
+        checkpoint=checkpoint,
+        source_path=source_path,
+        source_options=source_options,
     )
-
-    print("Post response with Transcription ID:", post_response)
-    result_url = post_response.get("result_url")
-
-    if result_url:
-        while True:
-            print("Polling for results...")
-            poll_response = make_request(result_url, headers)
-
-            if poll_response.get("status") == "done":
-                file_path = "recordings/transcript.json"
-                print("- Transcription done | recording results to {file_path}")
-                # save the json response to recordings folder as transcript.json
-                with open(file_path, "w") as f:
-                    json.dump(poll_response, f, indent=2)
-                break
-            elif poll_response.get("status") == "error":
-                file_path = "recordings/error.json"
-                print("- Transcription failed | recording results to {file_path}")
-                with open(file_path, "w") as f:
-                    json.dump(poll_response, f, indent=2)
-            else:
-                print("Transcription status:", poll_response.get("status"))
-            sleep(1)
-
-    print("- End of work")
+    if offsets and poll_response.get("status") == "done":
+        remap_transcript(poll_response, offsets)
+    return poll_response
+
+
+def save_transcript(config, checkpoint, poll_response):
+    if poll_response.get("status") == "done":
+        file_path = config.transcript_path
+        print(f"- Transcription done | recording results to {file_path}")
+        # save the json response to the job folder as transcript.json
+        with open(file_path, "w") as f:
+            json.dump(poll_response, f, indent=2)
+        # SRT, WebVTT and one utterance per line, for players and search
+        with phase("convert"):
+            write_transcript_formats(config.output_dir, poll_response)
+        if os.path.exists(config.error_path):
+            # left by an earlier attempt
+            os.remove(config.error_path)
+        checkpoint.update(stage="transcribed")
+    else:
+        file_path = config.error_path
+        print(f"- Transcription failed | recording results to {file_path}")
+        with open(file_path, "w") as f:
+            json.dump(poll_response, f, indent=2)
 
 
 if __name__ == "__main__":
     click.echo("starting google meet recorder...")
-    asyncio.run(join_meet())
+    asyncio.run(join_meet(MeetConfig.from_env()))
     click.echo("finished recording google meet.")
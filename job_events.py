@@ -0,0 +1,110 @@
+import asyncio
+import json
+import os
+
+# Events kept per subscriber; a client too slow to read them loses the oldest
+JOB_EVENTS_QUEUE_SIZE = int(os.getenv("JOB_EVENTS_QUEUE_SIZE", 256))
+# Recent events of a job replayed to clients reconnecting with Last-Event-ID
+JOB_EVENTS_HISTORY = int(os.getenv("JOB_EVENTS_HISTORY", 100))
+# Without events for this long, the stream checks the job store (the job may
+# run on another worker) and sends a keep-alive comment
+JOB_EVENTS_KEEPALIVE_SECONDS = float(os.getenv("JOB_EVENTS_KEEPALIVE_SECONDS", 15))
+
+
+def format_event(event):
+    """
+    Server-Sent Events frame of an event; without an id, the client's
+    Last-Event-ID stays at the previous event
+    """
+    frame = f"id: {event['id']}\n" if event.get("id") else ""
+    return (
+        frame
+        + f"event: {event['event']}\n"
+        + f"data: {json.dumps(event['data'], default=str)}\n\n"
+    )
+
+
+class JobChannel:
+    def __init__(self):
+        self.subscribers = set()
+        self.history = []
+        self.next_id = 1
+
+
+class JobEvents:
+    """
+    Fans out the events of the jobs running in this worker to every client
+    following them.
+
+    A job's channel is opened when the job starts on this worker and
+    forgotten when it finishes; events of other jobs are dropped.
+    publish() can be called from any thread, e.g. from code traced inside
+    asyncio.to_thread; the events are delivered on the event loop.
+    """
+
+    def __init__(self, queue_size=JOB_EVENTS_QUEUE_SIZE, history=JOB_EVENTS_HISTORY):
+        self.queue_size = queue_size
+        self.history_size = history
+        self._channels = {}
+        self._loop = None
+
+    def open(self, job_id):
+        """
+        Start keeping the events of a job run by this worker
+        """
+        if job_id not in self._channels:
+            self._channels[job_id] = JobChannel()
+
+    def publish(self, job_id, event, data):
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._dispatch, job_id, event, data)
+            return
+        self._dispatch(job_id, event, data)
+
+    def _dispatch(self, job_id, event, data):
+        channel = self._channels.get(job_id)
+        if channel is None:
+            # finished, deleted or running on another worker
+            return
+
+        message = {"id": channel.next_id, "event": event, "data": data}
+        channel.next_id += 1
+        channel.history.append(message)
+        del channel.history[: -self.history_size]
+
+        for queue in channel.subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    def subscribe(self, job_id, last_event_id=None):
+        """
+        Queue receiving the job's events from now on, after the ones
+        following last_event_id still in the history; it stays empty for a
+        job this worker does not run
+        """
+        queue = asyncio.Queue(self.queue_size)
+        channel = self._channels.get(job_id)
+        if channel is None:
+            return queue
+        if last_event_id is not None:
+            for message in channel.history[-self.queue_size :]:
+                if message["id"] > last_event_id:
+                    queue.put_nowait(message)
+        channel.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, job_id, queue):
+        channel = self._channels.get(job_id)
+        if channel is not None:
+            channel.subscribers.discard(queue)
+
+    def forget(self, job_id):
+        """
+        Drop the history of a finished job; clients still reading keep their
+        queue until they leave
+        """
+        self._channels.pop(job_id, None)
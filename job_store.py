@@ -0,0 +1,407 @@
+import asyncio
+import base64
+import json
+import os
+import sqlite3
+import threading
+
+from datetime import datetime, timedelta
+
+import psutil
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join("recordings", "jobs.db"))
+# Seconds a writer waits for another worker's transaction to finish
+JOB_DB_BUSY_TIMEOUT = 5
+
+# Finished jobs are deleted this long after completion
+JOB_TTL_HOURS = float(os.getenv("JOB_TTL_HOURS", 24))
+JOB_EXPIRY_INTERVAL_SECONDS = int(os.getenv("JOB_EXPIRY_INTERVAL_SECONDS", 60))
+# Expired jobs are deleted in batches to keep write transactions short
+JOB_EXPIRY_BATCH = 500
+
+# Page sizes of the /jobs listing and of its NDJSON export
+JOB_PAGE_SIZE = 50
+JOB_MAX_PAGE_SIZE = 500
+JOB_EXPORT_BATCH = 500
+
+# Jobs in these states belong to a live worker process
+IN_FLIGHT_STATUSES = ("starting", "queued", "running")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    completed_at TEXT,
+    worker TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+CREATE INDEX IF NOT EXISTS jobs_created_at ON jobs (created_at);
+CREATE INDEX IF NOT EXISTS jobs_completed_at ON jobs (completed_at);
+CREATE INDEX IF NOT EXISTS jobs_status_created_at ON jobs (status, created_at, job_id);
+CREATE INDEX IF NOT EXISTS jobs_created_at_job_id ON jobs (created_at, job_id);
+
+CREATE TABLE IF NOT EXISTS job_counts (
+    status TEXT PRIMARY KEY,
+    jobs INTEGER NOT NULL DEFAULT 0,
+    duration_total INTEGER NOT NULL DEFAULT 0,
+    durations INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Per-status counters kept up to date in the same transaction as the job
+# change, so /stats never has to scan the jobs table
+_ADD_NEW = """
+    INSERT OR IGNORE INTO job_counts (status) VALUES (NEW.status);
+    UPDATE job_counts SET
+        jobs = jobs + 1,
+        duration_total = duration_total + COALESCE(json_extract(NEW.data, '$.duration_seconds'), 0),
+        durations = durations + (COALESCE(json_extract(NEW.data, '$.duration_seconds'), 0) > 0)
+    WHERE status = NEW.status;
+"""
+_REMOVE_OLD = """
+    UPDATE job_counts SET
+        jobs = jobs - 1,
+        duration_total = duration_total - COALESCE(json_extract(OLD.data, '$.duration_seconds'), 0),
+        durations = durations - (COALESCE(json_extract(OLD.data, '$.duration_seconds'), 0) > 0)
+    WHERE status = OLD.status;
+"""
+COUNT_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS job_counts_insert AFTER INSERT ON jobs "
+    f"BEGIN {_ADD_NEW} END",
+    "CREATE TRIGGER IF NOT EXISTS job_counts_delete AFTER DELETE ON jobs "
+    f"BEGIN {_REMOVE_OLD} END",
+    "CREATE TRIGGER IF NOT EXISTS job_counts_update AFTER UPDATE OF status, data ON jobs "
+    f"BEGIN {_REMOVE_OLD} {_ADD_NEW} END",
+)
+
+REBUILD_COUNTS = (
+    "DELETE FROM job_counts",
+    """
+    INSERT INTO job_counts (status, jobs, duration_total, durations)
+    SELECT
+        status,
+        COUNT(*),
+        COALESCE(SUM(json_extract(data, '$.duration_seconds')), 0),
+        SUM(COALESCE(json_extract(data, '$.duration_seconds'), 0) > 0)
+    FROM jobs GROUP BY status
+    """,
+)
+
+
+def encode_cursor(job):
+    position = json.dumps([job["created_at"], job["job_id"]])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    (created_at, job_id) of the last job of the previous page; raises
+    ValueError for a malformed cursor.
+    """
+    try:
+        created_at, job_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return created_at, job_id
+
+
+def project(job, fields):
+    """
+    Only the requested fields of a job, or the whole job without fields
+    """
+    if not fields:
+        return job
+    return {field: job.get(field) for field in fields}
+
+
+def _worker_id(pid):
+    # the start time tells a live worker apart from a reused pid
+    return f"{pid}:{psutil.Process(pid).create_time()}"
+
+
+def worker_alive(worker):
+    if not worker:
+        return False
+    pid = int(worker.split(":", 1)[0])
+    try:
+        return _worker_id(pid) == worker
+    except psutil.Error:
+        return False
+
+
+class JobStore:
+    """
+    Job statuses kept in SQLite, shared by every API worker on the host.
+
+    Each row keeps the indexed columns next to the full job as JSON. The
+    database runs in WAL mode so readers never block the writing worker.
+    """
+
+    def __init__(self, path=JOB_DB_PATH):
+        self.path = path
+        self.worker = _worker_id(os.getpid())
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            path,
+            timeout=JOB_DB_BUSY_TIMEOUT,
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._create_count_triggers()
+
+    def _create_count_triggers(self):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                exists = self._db.execute(
+                    "SELECT 1 FROM sqlite_master "
+                    "WHERE type = 'trigger' AND name = 'job_counts_insert'"
+                ).fetchone()
+                if not exists:
+                    # databases created before the counters: count the jobs once
+                    for statement in COUNT_TRIGGERS + REBUILD_COUNTS:
+                        self._db.execute(statement)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _execute(self, query, params=()):
+        with self._lock:
+            return self._db.execute(query, params).fetchall()
+
+    def create(self, job):
+        """
+        Store a new job, owned by this worker
+        """
+        self._execute(
+            "INSERT INTO jobs (job_id, status, created_at, completed_at, worker, data) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                job["job_id"],
+                job["status"],
+                job["created_at"],
+                job.get("completed_at"),
+                self.worker,
+                json.dumps(job),
+            ),
+        )
+
+    def get(self, job_id):
+        rows = self._execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,))
+        return json.loads(rows[0]["data"]) if rows else None
+
+    def _apply(self, job_id, fields):
+        row = self._db.execute(
+            "SELECT data FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = json.loads(row["data"])
+        job.update(fields)
+        self._db.execute(
+            "UPDATE jobs SET status = ?, completed_at = ?, data = ? WHERE job_id = ?",
+            (job["status"], job.get("completed_at"), json.dumps(job), job_id),
+        )
+        return job
+
+    def update_many(self, changes):
+        """
+        Apply {job_id: fields} in a single transaction and return the updated
+        jobs; jobs deleted meanwhile are None.
+        """
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                updated = {
+                    job_id: self._apply(job_id, fields)
+                    for job_id, fields in changes.items()
+                }
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return updated
+
+    def update(self, job_id, **fields):
+        """
+        Change some fields of a job; returns the updated job, or None if it
+        has been deleted meanwhile.
+        """
+        return self.update_many({job_id: fields})[job_id]
+
+    def claim(self, job_id, **fields):
+        """
+        Take over a job for this worker and change some of its fields, e.g.
+        to retry it. Returns the updated job, or None if it does not exist
+        or is still in flight on a live worker.
+        """
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT status, worker FROM jobs WHERE job_id = ?", (job_id,)
+                ).fetchone()
+                job = None
+                if row is not None and not (
+                    row["status"] in IN_FLIGHT_STATUSES and worker_alive(row["worker"])
+                ):
+                    job = self._apply(job_id, fields)
+                    self._db.execute(
+                        "UPDATE jobs SET worker = ? WHERE job_id = ?",
+                        (self.worker, job_id),
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return job
+
+    def delete(self, job_id):
+        """
+        Remove a job; returns False if it did not exist
+        """
+        with self._lock:
+            cursor = self._db.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+        return cursor.rowcount > 0
+
+    def page(
+        self,
+        statuses=None,
+        created_after=None,
+        created_before=None,
+        cursor=None,
+        limit=JOB_PAGE_SIZE,
+    ):
+        """
+        One page of jobs, newest first, and the cursor of the next page
+        (None on the last page).
+
+        Pages are fetched by keyset on (created_at, job_id), so each page
+        costs the same no matter how deep into the history it is.
+        """
+        conditions, params = [], []
+        if statuses:
+            conditions.append(f"status IN ({', '.join('?' for _ in statuses)})")
+            params.extend(statuses)
+        if created_after:
+            conditions.append("created_at >= ?")
+            params.append(created_after)
+        if created_before:
+            conditions.append("created_at < ?")
+            params.append(created_before)
+        if cursor:
+            conditions.append("(created_at, job_id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._execute(
+            f"SELECT data FROM jobs {where} "
+            "ORDER BY created_at DESC, job_id DESC LIMIT ?",
+            params + [limit + 1],
+        )
+        jobs = [json.loads(row["data"]) for row in rows[:limit]]
+        next_cursor = encode_cursor(jobs[-1]) if len(rows) > limit else None
+        return jobs, next_cursor
+
+    def iter_jobs(self, **filters):
+        """
+        Every job matching the filters, fetched page by page
+        """
+        cursor = filters.pop("cursor", None)
+        while True:
+            jobs, cursor = self.page(cursor=cursor, limit=JOB_EXPORT_BATCH, **filters)
+            yield from jobs
+            if cursor is None:
+                return
+
+    def count_by_status(self):
+        rows = self._execute("SELECT status, jobs FROM job_counts WHERE jobs > 0")
+        return {row["status"]: row["jobs"] for row in rows}
+
+    def average_duration(self):
+        rows = self._execute(
+            "SELECT SUM(duration_total) AS total, SUM(durations) AS n FROM job_counts"
+        )
+        total, n = rows[0]["total"], rows[0]["n"]
+        return total / n if n else 0
+
+    def delete_completed_before(self, cutoff, limit=JOB_EXPIRY_BATCH):
+        """
+        Remove up to limit jobs that finished before the cutoff datetime,
+        oldest first, and return their ids.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "DELETE FROM jobs WHERE job_id IN ("
+                "SELECT job_id FROM jobs WHERE completed_at < ? "
+                "ORDER BY completed_at LIMIT ?) RETURNING job_id",
+                (cutoff.isoformat(), limit),
+            ).fetchall()
+        return [row["job_id"] for row in rows]
+
+    def expire(self, ttl_hours=JOB_TTL_HOURS):
+        """
+        Delete every job that finished more than ttl_hours ago and return
+        their ids.
+        """
+        cutoff = datetime.now() - timedelta(hours=ttl_hours)
+        expired = []
+        while True:
+            batch = self.delete_completed_before(cutoff)
+            expired.extend(batch)
+            if len(batch) < JOB_EXPIRY_BATCH:
+                return expired
+
+    async def expire_periodically(
+        self, on_expired=None, interval=JOB_EXPIRY_INTERVAL_SECONDS
+    ):
+        """
+        Background task deleting expired jobs every interval seconds
+        """
+        while True:
+            try:
+                # batch deletes off the event loop, requests keep being served
+                expired = await asyncio.to_thread(self.expire)
+                if expired:
+                    print(f"Cleaned {len(expired)} old jobs")
+                    if on_expired:
+                        on_expired(expired)
+            except Exception as e:
+                print(f"Error expiring old jobs: {e}")
+            await asyncio.sleep(interval)
+
+    def mark_orphaned(self):
+        """
+        Fail the in-flight jobs whose worker process is gone, e.g. after a
+        restart, and return their ids.
+        """
+        placeholders = ", ".join("?" for _ in IN_FLIGHT_STATUSES)
+        rows = self._execute(
+            f"SELECT job_id, worker FROM jobs WHERE status IN ({placeholders})",
+            IN_FLIGHT_STATUSES,
+        )
+        orphaned = [row["job_id"] for row in rows if not worker_alive(row["worker"])]
+        if orphaned:
+            failed = {
+                "status": "failed",
+                "message": "Job interrupted by a server restart",
+                "completed_at": datetime.now().isoformat(),
+                "queue_position": None,
+            }
+            self.update_many({job_id: failed for job_id in orphaned})
+        return orphaned
+
+    def close(self):
+        with self._lock:
+            self._db.close()
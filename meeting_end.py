@@ -0,0 +1,160 @@
+import asyncio
+import os
+import re
+import subprocess
+
+from selenium.common.exceptions import WebDriverException
+
+# How often the Meet page is checked
+MEETING_END_CHECK_SECONDS = float(os.getenv("MEETING_END_CHECK_SECONDS", 5))
+# The recording stops once the bot has been alone for this long...
+MEETING_ALONE_SECONDS = float(os.getenv("MEETING_ALONE_SECONDS", 180))
+# ...or the meeting audio has stayed below SILENCE_NOISE_DB for this long
+MEETING_SILENCE_SECONDS = float(os.getenv("MEETING_SILENCE_SECONDS", 300))
+SILENCE_NOISE_DB = int(os.getenv("SILENCE_NOISE_DB", -50))
+
+# Texts Meet shows once the bot is no longer in the call
+ENDED_PHRASES = (
+    "you left the meeting",
+    "you've been removed from the meeting",
+    "you have been removed from the meeting",
+    "the meeting has ended",
+    "return to home screen",
+)
+# Texts Meet shows while the bot is the only participant
+ALONE_PHRASES = (
+    "you're the only one here",
+    "no one else is here",
+)
+
+# Participant count of the people button, e.g. aria-label="Show everyone (3)"
+PAGE_STATE_SCRIPT = """
+const text = document.body ? document.body.innerText.toLowerCase() : "";
+let participants = null;
+for (const element of document.querySelectorAll("[aria-label]")) {
+    const match = element.getAttribute("aria-label").match(
+        /(?:show everyone|people|participants)\\D*(\\d+)/i
+    );
+    if (match) {
+        participants = parseInt(match[1], 10);
+        break;
+    }
+}
+return [text, participants];
+"""
+
+SILENCE_START = re.compile(r"silence_start: (-?[\d.]+)")
+
+
+def page_state(driver):
+    """
+    "ended", "alone" or None, from what the Meet page shows
+    """
+    try:
+        text, participants = driver.execute_script(PAGE_STATE_SCRIPT)
+    except WebDriverException:
+        return None
+    if any(phrase in text for phrase in ENDED_PHRASES):
+        return "ended"
+    if any(phrase in text for phrase in ALONE_PHRASES):
+        return "alone"
+    if participants is not None and participants <= 1:
+        return "alone"
+    return None
+
+
+class MeetingEndMonitor:
+    """
+    Watches a recorded meeting for signs that it is over: the page says the
+    call ended or the bot was removed, the bot stayed alone for
+    MEETING_ALONE_SECONDS, or the audio stayed silent for
+    MEETING_SILENCE_SECONDS.
+    """
+
+    def __init__(
+        self,
+        driver,
+        audio_source,
+        check_interval=MEETING_END_CHECK_SECONDS,
+        alone_seconds=MEETING_ALONE_SECONDS,
+        silence_seconds=MEETING_SILENCE_SECONDS,
+    ):
+        self.driver = driver
+        self.audio_source = audio_source
+        self.check_interval = check_interval
+        self.alone_seconds = alone_seconds
+        self.silence_seconds = silence_seconds
+
+    async def wait_for_end(self):
+        """
+        Return the reason the meeting is considered over; runs until then.
+
+        A watcher that fails, e.g. when the audio source can't be opened,
+        leaves the other one watching; the last failure is raised once
+        both have failed.
+        """
+        page = asyncio.ensure_future(self._watch_page())
+        silence = asyncio.ensure_future(self._watch_silence())
+        try:
+            pending = {page, silence}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                    print(f"Meeting end detection failed: {error!r}")
+            raise error
+        finally:
+            page.cancel()
+            silence.cancel()
+            # the silence watcher's ffmpeg is killed before returning
+            await asyncio.gather(page, silence, return_exceptions=True)
+
+    async def _watch_page(self):
+        loop = asyncio.get_running_loop()
+        alone_since = None
+        while True:
+            state = await asyncio.to_thread(page_state, self.driver)
+            if state == "ended":
+                return "meeting ended"
+            if state == "alone":
+                alone_since = alone_since or loop.time()
+                if loop.time() - alone_since >= self.alone_seconds:
+                    return f"alone for {self.alone_seconds:.0f}s"
+            else:
+                alone_since = None
+            await asyncio.sleep(self.check_interval)
+
+    async def _watch_silence(self):
+        # silencedetect only reports a silence once it lasted silence_seconds
+        process = await asyncio.create_subprocess_exec(
+            "ffmpeg",
+            "-hide_banner",
+            "-nostats",
+            "-f",
+            "pulse",
+            "-i",
+            self.audio_source,
+            "-af",
+            f"silencedetect=noise={SILENCE_NOISE_DB}dB:d={self.silence_seconds}",
+            "-f",
+            "null",
+            "-",
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        try:
+            async for line in process.stderr:
+                if SILENCE_START.search(line.decode(errors="replace")):
+                    return f"silent for {self.silence_seconds:.0f}s"
+            # the level meter stopped: let the page checks decide
+            await asyncio.Future()
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
@@ -0,0 +1,140 @@
+import asyncio
+import os
+import time
+
+from contextlib import contextmanager
+
+import psutil
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+from tracing import span
+
+# Seconds between two samples of ffmpeg CPU and Chrome memory
+METRICS_SAMPLE_SECONDS = float(os.getenv("METRICS_SAMPLE_SECONDS", 5))
+
+PHASE_SECONDS = Histogram(
+    "meet_bot_phase_seconds",
+    "Duration of each phase of a recording job",
+    ["phase"],
+    buckets=(0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200),
+)
+JOB_FAILURES = Counter(
+    "meet_bot_job_failures_total", "Failed recording jobs by reason", ["reason"]
+)
+JOBS_RUNNING = Gauge("meet_bot_jobs_running", "Recording jobs holding a slot")
+JOBS_QUEUED = Gauge("meet_bot_jobs_queued", "Recording jobs waiting for a slot")
+
+FFMPEG_CPU_PERCENT = Gauge(
+    "meet_bot_ffmpeg_cpu_percent", "CPU usage of the ffmpeg recording a slot", ["slot"]
+)
+CHROME_RSS_MB = Gauge(
+    "meet_bot_chrome_rss_megabytes", "Resident memory of the Chrome of a slot", ["slot"]
+)
+FFMPEG_CPU_SECONDS_PER_MINUTE = Histogram(
+    "meet_bot_ffmpeg_cpu_seconds_per_minute",
+    "ffmpeg CPU seconds per recorded minute, per job",
+    buckets=(5, 10, 20, 30, 45, 60, 90, 120, 180, 240),
+)
+CHROME_PEAK_RSS_MB = Histogram(
+    "meet_bot_chrome_peak_rss_megabytes",
+    "Peak Chrome resident memory during a recording, per job",
+    buckets=(256, 512, 768, 1024, 1536, 2048, 3072, 4096),
+)
+TRANSCRIPT_CACHE_REQUESTS = Counter(
+    "meet_bot_transcript_cache_requests_total",
+    "Transcription cache lookups by result",
+    ["result"],
+)
+TRANSCRIPT_CACHE_BYTES = Gauge(
+    "meet_bot_transcript_cache_bytes", "Size of the transcription cache on disk"
+)
+
+
+@contextmanager
+def phase(name, **attributes):
+    """
+    Time one phase of a job into PHASE_SECONDS and as a span of its trace
+    """
+    with span(name, **attributes) as current, PHASE_SECONDS.labels(name).time():
+        yield current
+
+
+def _process_tree(pid):
+    try:
+        process = psutil.Process(pid)
+        return [process] + process.children(recursive=True)
+    except psutil.Error:
+        return []
+
+
+def tree_cpu_seconds(pid):
+    """
+    User and system CPU time of a process and its children
+    """
+    total = 0
+    for process in _process_tree(pid):
+        try:
+            times = process.cpu_times()
+            total += times.user + times.system
+        except psutil.Error:
+            pass
+    return total
+
+
+def tree_rss_mb(pid):
+    """
+    Resident memory of a process and its children
+    """
+    total = 0
+    for process in _process_tree(pid):
+        try:
+            total += process.memory_info().rss
+        except psutil.Error:
+            pass
+    return total / 2**20
+
+
+async def sample_recording(slot, ffmpeg_pid, browser_pid, interval=METRICS_SAMPLE_SECONDS):
+    """
+    Update the slot's ffmpeg CPU and Chrome memory gauges until cancelled,
+    then record the job's totals.
+    """
+    started_at = time.monotonic()
+    cpu_seconds = 0
+    peak_rss_mb = 0
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            # ffmpeg's time is gone once it has exited, keep the last reading
+            current = await asyncio.to_thread(tree_cpu_seconds, ffmpeg_pid)
+            if current:
+                FFMPEG_CPU_PERCENT.labels(slot).set(
+                    max(current - cpu_seconds, 0) * 100 / interval
+                )
+                cpu_seconds = current
+            if browser_pid:
+                rss_mb = await asyncio.to_thread(tree_rss_mb, browser_pid)
+                CHROME_RSS_MB.labels(slot).set(rss_mb)
+                peak_rss_mb = max(peak_rss_mb, rss_mb)
+    finally:
+        minutes = (time.monotonic() - started_at) / 60
+        if cpu_seconds and minutes:
+            FFMPEG_CPU_SECONDS_PER_MINUTE.observe(cpu_seconds / minutes)
+        if peak_rss_mb:
+            CHROME_PEAK_RSS_MB.observe(peak_rss_mb)
+        FFMPEG_CPU_PERCENT.labels(slot).set(0)
+        CHROME_RSS_MB.labels(slot).set(0)
+
+
+def render():
+    """
+    Body and content type of the /metrics response
+    """
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,157 @@
+import os
+
+from dataclasses import dataclass
+from typing import Optional
+
+from audio import AUDIO_CHANNELS, AUDIO_FORMATS, AUDIO_SAMPLE_RATE, get_audio_format
+
+# audio:   no screen capture, the meeting audio is encoded straight to the
+#          upload format, which is by far the cheapest mode
+# low_fps: audio plus a screen capture at LOW_FPS_FRAMERATE
+# full:    audio plus video encoded with the job's encoding profile
+RECORDING_MODES = ("audio", "low_fps", "full")
+RECORDING_MODE = os.getenv("RECORDING_MODE", "full").lower()
+LOW_FPS_FRAMERATE = int(os.getenv("LOW_FPS_FRAMERATE", 2))
+
+# Size of the Xvfb screen that is captured
+SCREEN_SIZE = "1920x1080"
+
+
+@dataclass(frozen=True)
+class EncodingProfile:
+    """
+    libx264 settings of a video recording
+    """
+
+    preset: str
+    crf: int
+    framerate: int
+    # output size, the screen is captured at SCREEN_SIZE and scaled down
+    resolution: str = SCREEN_SIZE
+    # drop frames identical to the previous one (mpdecimate), which is most
+    # frames of a meeting where nobody shares a video
+    decimate: bool = False
+    tune: Optional[str] = None
+    audio_bitrate: str = "96k"
+
+
+ENCODING_PROFILES = {
+    # 1080p30, the original recorder settings
+    "quality": EncodingProfile(preset="medium", crf=23, framerate=30),
+    "balanced": EncodingProfile(
+        preset="veryfast", crf=26, framerate=15, resolution="1280x720", decimate=True
+    ),
+    "economy": EncodingProfile(
+        preset="ultrafast", crf=30, framerate=10, resolution="1280x720", decimate=True
+    ),
+    # used by the low_fps recording mode
+    "low_fps": EncodingProfile(
+        preset="veryfast",
+        crf=28,
+        framerate=LOW_FPS_FRAMERATE,
+        decimate=True,
+        tune="stillimage",
+        audio_bitrate="64k",
+    ),
+}
+ENCODING_PROFILE = os.getenv("ENCODING_PROFILE", "quality").lower()
+
+
+def recording_audio_format():
+    """
+    Format of audio-only recordings: the upload format, opus if uploads
+    keep the original file
+    """
+    audio_format = get_audio_format()
+    return audio_format if audio_format in AUDIO_FORMATS else "opus"
+
+
+def recording_extension(mode):
+    if mode == "audio":
+        extension, _, _ = AUDIO_FORMATS[recording_audio_format()]
+        return extension
+    return "mp4"
+
+
+def has_video(mode):
+    return mode != "audio"
+
+
+def encoding_profile(mode, profile_name=None):
+    """
+    Encoding profile of a video recording mode
+    """
+    if mode == "low_fps":
+        return ENCODING_PROFILES["low_fps"]
+    name = profile_name or ENCODING_PROFILE
+    if name not in ENCODING_PROFILES:
+        raise ValueError(f"Unknown encoding profile {name!r}")
+    return ENCODING_PROFILES[name]
+
+
+def video_input_args(profile, display):
+    # capturing fewer frames is what saves most of the CPU
+    return (
+        f"-video_size {SCREEN_SIZE} -framerate {profile.framerate} "
+        f"-f x11grab -i {display}"
+    )
+
+
+def audio_input_args(audio_source):
+    return f"-f pulse -i {audio_source}"
+
+
+def video_output_args(profile):
+    filters = []
+    if profile.decimate:
+        # at least one frame a second: a fully static screen would otherwise
+        # never reach -t and the recording would not stop
+        filters.append(f"mpdecimate=max={profile.framerate}")
+    if profile.resolution != SCREEN_SIZE:
+        width, height = profile.resolution.split("x")
+        filters.append(f"scale={width}:{height}")
+
+    args = [f"-c:v libx264 -preset {profile.preset} -crf {profile.crf}"]
+    if profile.tune:
+        args.append(f"-tune {profile.tune}")
+    if filters:
+        args.append(f"-vf {','.join(filters)}")
+    if profile.decimate:
+        # keep the timestamps of the frames left, so audio stays in sync
+        args.append("-fps_mode vfr")
+    args.append(f"-pix_fmt yuv420p -c:a aac -b:a {profile.audio_bitrate}")
+    return " ".join(args)
+
+
+def output_args(mode, profile=None):
+    """
+    Codec arguments of the main recording output
+    """
+    if mode == "audio":
+        _, _, codec_args = AUDIO_FORMATS[recording_audio_format()]
+        return f"-vn -ac {AUDIO_CHANNELS} -ar {AUDIO_SAMPLE_RATE} {codec_args}"
+    return video_output_args(profile or encoding_profile(mode))
+
+
+def build_record_command(
+    mode, display, audio_source, duration, output_path, profile_name=None
+):
+    """
+    ffmpeg command recording the meeting in the given mode, and the input
+    index of the audio stream for extra outputs
+    """
+    if mode not in RECORDING_MODES:
+        raise ValueError(f"Unknown recording mode {mode!r}")
+
+    if has_video(mode):
+        profile = encoding_profile(mode, profile_name)
+        inputs = f"{video_input_args(profile, display)} {audio_input_args(audio_source)}"
+        audio_input = 1
+        outputs = output_args(mode, profile)
+    else:
+        inputs = audio_input_args(audio_source)
+        audio_input = 0
+        outputs = output_args(mode)
+
+    command = f"ffmpeg -y {inputs} -t {duration} {outputs} {output_path}"
+    return command, audio_input
@@ -0,0 +1,167 @@
+import asyncio
+import heapq
+import itertools
+import os
+import subprocess
+import threading
+import time
+
+# Resources reserved for one recording (Chrome + ffmpeg x11grab/libx264)
+CPUS_PER_SLOT = float(os.getenv("CPUS_PER_SLOT", 2))
+MEMORY_PER_SLOT_MB = int(os.getenv("MEMORY_PER_SLOT_MB", 1536))
+
+# Slot i records from Xvfb display :(XVFB_BASE_DISPLAY + i)
+XVFB_BASE_DISPLAY = int(os.getenv("XVFB_BASE_DISPLAY", 99))
+XVFB_SCREEN = "1920x1080x24"
+XVFB_START_TIMEOUT = 5
+
+
+def default_slot_count():
+    """
+    Number of recordings the host can run at once, from its CPUs and RAM,
+    unless RECORDING_SLOTS is set.
+    """
+    if os.getenv("RECORDING_SLOTS"):
+        return max(1, int(os.getenv("RECORDING_SLOTS")))
+
+    by_cpu = int((os.cpu_count() or 1) // CPUS_PER_SLOT)
+    try:
+        memory_mb = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // 2**20
+        by_memory = int(memory_mb // MEMORY_PER_SLOT_MB)
+    except (ValueError, OSError):
+        by_memory = by_cpu
+    return max(1, min(by_cpu, by_memory))
+
+
+class RecordingSlot:
+    """
+    One recording seat: a dedicated Xvfb display and PulseAudio sink
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.display = f":{XVFB_BASE_DISPLAY + index}"
+        self.audio_sink = f"SlotOutput{index}"
+        self.ready = False
+        self._prepare_lock = threading.Lock()
+
+    def _display_running(self):
+        return os.path.exists(f"/tmp/.X11-unix/X{XVFB_BASE_DISPLAY + self.index}")
+
+    def prepare(self):
+        """
+        Start the slot's display and create its sink, once
+        """
+        with self._prepare_lock:
+            if not self.ready:
+                self._start()
+
+    def _start(self):
+        if not self._display_running():
+            print(f"Starting Xvfb on {self.display}")
+            subprocess.Popen(
+                ["Xvfb", self.display, "-screen", "0", XVFB_SCREEN, "-nolisten", "tcp"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            deadline = time.monotonic() + XVFB_START_TIMEOUT
+            while not self._display_running() and time.monotonic() < deadline:
+                time.sleep(0.1)
+
+        subprocess.check_output(
+            f"sudo pactl load-module module-null-sink sink_name={self.audio_sink} "
+            f"sink_properties=device.description=Recording_Slot_{self.index}",
+            shell=True,
+        )
+        self.ready = True
+
+
+class SlotScheduler:
+    """
+    Hands out a fixed number of recording slots.
+
+    Jobs that arrive while every slot is busy wait in a priority queue
+    (higher priority first, FIFO within a priority) instead of starting
+    and degrading the recordings already running.
+    """
+
+    def __init__(self, slot_count=None, on_queue_change=None):
+        self.slots = [RecordingSlot(i) for i in range(slot_count or default_slot_count())]
+        self._free = list(reversed(self.slots))
+        self._waiting = []
+        self._counter = itertools.count()
+        self.on_queue_change = on_queue_change
+
+    @property
+    def total_slots(self):
+        return len(self.slots)
+
+    @property
+    def free_slots(self):
+        return len(self._free)
+
+    @property
+    def queued(self):
+        return len(self._waiting)
+
+    def waiting_jobs(self):
+        """
+        Job ids of the queued jobs, in the order they will get a slot
+        """
+        return [entry[2] for entry in sorted(self._waiting)]
+
+    def queue_position(self, job_id):
+        """
+        1-based position of a queued job, or None if it is not waiting
+        """
+        for position, waiting_job_id in enumerate(self.waiting_jobs(), 1):
+            if waiting_job_id == job_id:
+                return position
+        return None
+
+    def _notify(self):
+        if self.on_queue_change:
+            self.on_queue_change(self.waiting_jobs())
+
+    async def acquire(self, job_id, priority=0, prefer=None):
+        """
+        Wait for a free slot, queueing behind jobs of higher or equal priority.
+
+        When several slots are free, one for which prefer(slot) is true is
+        picked first.
+        """
+        if self._free and not self._waiting:
+            for slot in reversed(self._free):
+                if prefer is not None and prefer(slot):
+                    self._free.remove(slot)
+                    return slot
+            return self._free.pop()
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (-priority, next(self._counter), job_id, future)
+        heapq.heappush(self._waiting, entry)
+        self._notify()
+
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # a slot was handed over right as the job was cancelled
+                self.release(future.result())
+            elif entry in self._waiting:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._notify()
+            raise
+
+    def release(self, slot):
+        """
+        Give the slot to the next queued job, or mark it free
+        """
+        while self._waiting:
+            _, _, _, future = heapq.heappop(self._waiting)
+            if not future.done():
+                future.set_result(slot)
+                self._notify()
+                return
+        self._free.append(slot)
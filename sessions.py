@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from selenium.webdriver.common.by import By
+
+from waits import visible, wait_for
+
+# Saved Google session cookies, one file per account
+SESSION_CACHE_DIR = os.getenv("SESSION_CACHE_DIR", "sessions")
+# Sessions older than this are not reused even if their cookies are valid
+SESSION_MAX_AGE_HOURS = float(os.getenv("SESSION_MAX_AGE_HOURS", 24 * 7))
+SESSION_CHECK_TIMEOUT = 10
+
+# Cookies Google needs to consider a browser signed in
+REQUIRED_COOKIES = {"SID", "HSID", "SSID"}
+
+
+def session_path(email):
+    # the file name must not reveal the account
+    digest = hashlib.sha256(email.strip().lower().encode()).hexdigest()
+    return os.path.join(SESSION_CACHE_DIR, f"{digest}.json")
+
+
+def load_session(email):
+    """
+    Cookies saved for the account, or None if missing, too old or expired
+    """
+    path = session_path(email)
+    try:
+        with open(path) as f:
+            session = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    now = time.time()
+    if now - session.get("saved_at", 0) > SESSION_MAX_AGE_HOURS * 3600:
+        return None
+
+    cookies = session.get("cookies") or []
+    alive = {
+        cookie["name"]
+        for cookie in cookies
+        if not cookie.get("expires") or cookie["expires"] < 0 or cookie["expires"] > now
+    }
+    if not REQUIRED_COOKIES <= alive:
+        return None
+    return cookies
+
+
+def save_session(driver, email):
+    """
+    Persist every Google cookie of the browser for later jobs
+    """
+    cookies = driver.execute_cdp_cmd("Network.getAllCookies", {}).get("cookies", [])
+    cookies = [c for c in cookies if "google" in c.get("domain", "")]
+    if not cookies:
+        return
+
+    os.makedirs(SESSION_CACHE_DIR, exist_ok=True)
+    # written atomically and readable by the owner only: they are credentials
+    fd, tmp_path = tempfile.mkstemp(dir=SESSION_CACHE_DIR)
+    with os.fdopen(fd, "w") as f:
+        json.dump({"saved_at": time.time(), "cookies": cookies}, f)
+    os.chmod(tmp_path, 0o600)
+    os.replace(tmp_path, session_path(email))
+
+
+def forget_session(email):
+    try:
+        os.remove(session_path(email))
+    except OSError:
+        pass
+
+
+def _signed_in_state(driver):
+    if "myaccount.google.com" in driver.current_url:
+        return "signed_in"
+    if visible(driver, By.NAME, "identifier") or visible(driver, By.NAME, "Passwd"):
+        return "signed_out"
+    return None
+
+
+async def restore_session(driver, email):
+    """
+    Load the account's saved cookies into the browser and check that Google
+    still accepts them. Returns True when the browser is signed in.
+    """
+    cookies = load_session(email)
+    if not cookies:
+        return False
+
+    cookie_fields = (
+        "name", "value", "domain", "path", "secure", "httpOnly", "sameSite", "expires"
+    )
+    driver.execute_cdp_cmd(
+        "Network.setCookies",
+        {
+            "cookies": [
+                {key: cookie[key] for key in cookie_fields if key in cookie}
+                for cookie in cookies
+            ]
+        },
+    )
+
+    # a valid session is redirected straight to the account page
+    driver.get("https://accounts.google.com")
+    state = await wait_for(lambda: _signed_in_state(driver), SESSION_CHECK_TIMEOUT)
+    if state != "signed_in":
+        print("Saved Google session has expired")
+        forget_session(email)
+        return False
+    return True
@@ -0,0 +1,182 @@
+import asyncio
+import csv
+import os
+
+from audio import (
+    AUDIO_CHANNELS,
+    AUDIO_FORMATS,
+    AUDIO_SAMPLE_RATE,
+    audio_content_type,
+    get_audio_format,
+)
+from gladia import transcribe
+
+# Length of each rolling audio segment cut while the meeting is recorded
+SEGMENT_SECONDS = int(os.getenv("SEGMENT_SECONDS", 60))
+
+# How often the segment list written by ffmpeg is checked for new segments
+SEGMENT_POLL_SECONDS = 1
+
+
+def segment_output_args(
+    segment_dir, duration, segment_seconds=SEGMENT_SECONDS, audio_input=1
+):
+    """
+    Extra ffmpeg output that cuts the pulse input (input audio_input) into
+    audio segments, listing each one in segments.csv as soon as it is complete.
+    """
+    audio_format = get_audio_format()
+    if audio_format not in AUDIO_FORMATS:
+        audio_format = "opus"
+    extension, _, codec_args = AUDIO_FORMATS[audio_format]
+
+    return (
+        f"-map {audio_input}:a -t {duration} -ac {AUDIO_CHANNELS} -ar {AUDIO_SAMPLE_RATE} {codec_args} "
+        f"-f segment -segment_time {segment_seconds} -reset_timestamps 1 "
+        f"-segment_list {segment_dir}/segments.csv -segment_list_type csv "
+        f"{segment_dir}/segment_%04d.{extension}"
+    )
+
+
+def read_segment_list(segment_dir):
+    """
+    Return the completed segments as (path, start_offset_seconds) tuples
+    """
+    list_path = os.path.join(segment_dir, "segments.csv")
+    if not os.path.exists(list_path):
+        return []
+
+    segments = []
+    with open(list_path, newline="") as f:
+        for row in csv.reader(f):
+            # Rows are only complete once ffmpeg wrote the end time
+            if len(row) < 3:
+                continue
+            try:
+                start = float(row[1])
+            except ValueError:
+                continue
+            segments.append((os.path.join(segment_dir, row[0]), start))
+    return segments
+
+
+def _shift_timestamps(items, offset):
+    for item in items:
+        for key in ("start", "end"):
+            if isinstance(item.get(key), (int, float)):
+                item[key] = item[key] + offset
+        if isinstance(item.get("words"), list):
+            _shift_timestamps(item["words"], offset)
+
+
+def merge_transcripts(results):
+    """
+    Merge per-segment Gladia results, given as (start_offset, response) in
+    order, into a single response with timestamps on the recording timeline.
+
+    Failed segments are left out and listed in segment_errors with their
+    offset; the merge only fails when no segment was transcribed.
+    """
+    utterances = []
+    full_transcript = []
+    languages = []
+    audio_duration = 0
+    errors = []
+
+    for offset, response in results:
+        if response.get("status") != "done":
+            errors.append({"start": offset, "response": response})
+            continue
+
+        result = response.get("result") or {}
+        transcription = result.get("transcription") or {}
+
+        segment_utterances = transcription.get("utterances") or []
+        _shift_timestamps(segment_utterances, offset)
+        utterances.extend(segment_utterances)
+
+        if transcription.get("full_transcript"):
+            full_transcript.append(transcription["full_transcript"])
+        for language in transcription.get("languages") or []:
+            if language not in languages:
+                languages.append(language)
+
+        audio_duration += (result.get("metadata") or {}).get("audio_duration") or 0
+
+    merged = {
+        "status": "error" if results and len(errors) == len(results) else "done",
+        "result": {
+            "metadata": {
+                "audio_duration": audio_duration,
+                "number_of_segments": len(results),
+            },
+            "transcription": {
+                "languages": languages,
+                "full_transcript": " ".join(full_transcript),
+                "utterances": utterances,
+            },
+        },
+    }
+    if errors:
+        merged["segment_errors"] = errors
+    return merged
+
+
+class SegmentTranscriber:
+    """
+    Transcribe audio segments as ffmpeg finishes writing them, while the
+    recording is still running.
+    """
+
+    def __init__(self, segment_dir, api_key, diarization):
+        self.segment_dir = segment_dir
+        self.api_key = api_key
+        self.diarization = diarization
+        self._tasks = {}
+
+    def _schedule_new_segments(self):
+        for path, start in read_segment_list(self.segment_dir):
+            if path in self._tasks:
+                continue
+            print(f"- Segment ready {path} (offset {start:.1f}s)")
+            task = asyncio.create_task(
+                transcribe(
+                    path, self.api_key, self.diarization, audio_content_type(path)
+                )
+            )
+            self._tasks[path] = (start, task)
+
+    async def watch(self, recording):
+        """
+        Schedule each finished segment until the recording task completes
+        """
+        while not recording.done():
+            self._schedule_new_segments()
+            await asyncio.sleep(SEGMENT_POLL_SECONDS)
+
+    async def finish(self):
+        """
+        Pick up the last segments and return the merged transcript
+        """
+        self._schedule_new_segments()
+        ordered = sorted(self._tasks.items(), key=lambda item: item[1][0])
+        responses = await asyncio.gather(
+            *(task for _, (_, task) in ordered), return_exceptions=True
+        )
+        results = []
+        for (path, (start, _)), response in zip(ordered, responses):
+            if isinstance(response, BaseException):
+                # one failed segment leaves a gap, not the whole transcript
+                print(f"- Segment {path} failed: {response!r}")
+                response = {"status": "error", "error": repr(response), "segment": path}
+            results.append((start, response))
+        return merge_transcripts(results)
+
+    async def close(self):
+        """
+        Cancel the segment transcriptions still running and wait for them
+        """
+        pending = [task for _, task in self._tasks.values() if not task.done()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
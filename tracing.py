@@ -0,0 +1,175 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+
+from contextlib import contextmanager
+
+TRACE_FILE = "trace.jsonl"
+
+# Exporter and innermost open span of the job the current task works for.
+# Both follow asyncio tasks and asyncio.to_thread calls through contextvars.
+_exporter = contextvars.ContextVar("trace_exporter", default=None)
+_current_span = contextvars.ContextVar("trace_span", default=None)
+
+
+class JsonlExporter:
+    """
+    Appends finished spans to a job's trace file, one JSON object per line,
+    and passes span starts and ends, events and progress to listener live
+    """
+
+    def __init__(self, path, append=False, listener=None):
+        self.path = path
+        self.listener = listener
+        self.trace_id = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a" if append else "w")
+
+    def export(self, span):
+        line = json.dumps(span, default=str)
+        with self._lock:
+            # spans of tasks that outlive the job are dropped
+            if self._file.closed:
+                return
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def notify(self, name, attributes):
+        if self.listener is None:
+            return
+        try:
+            self.listener(name, attributes)
+        except Exception as e:
+            # a broken listener must not fail the job
+            print(f"Trace listener failed on {name}: {e!r}")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class Span:
+    def __init__(self, name, trace_id, parent_id, attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = dict(attributes)
+        self.events = []
+        self.status = "ok"
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_seconds": self.duration,
+            "status": self.status,
+            "attributes": self.attributes,
+            "events": self.events,
+        }
+
+
+@contextmanager
+def trace_to(path, append=False, listener=None):
+    """
+    Export the spans opened within the block to the JSONL file at path,
+    after the spans already there with append=True.
+
+    listener(name, attributes) is called as spans start ("span_start") and
+    end ("span_end"), and for every event and progress report.
+    """
+    exporter = JsonlExporter(path, append, listener)
+    token = _exporter.set(exporter)
+    try:
+        yield exporter
+    finally:
+        _exporter.reset(token)
+        exporter.close()
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Time the block as a child of the current span; a no-op outside trace_to
+    """
+    exporter = _exporter.get()
+    if exporter is None:
+        yield None
+        return
+
+    parent = _current_span.get()
+    current = Span(
+        name, exporter.trace_id, parent.span_id if parent else None, attributes
+    )
+    token = _current_span.set(current)
+    exporter.notify("span_start", {"span": name})
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.attributes["error"] = repr(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.duration = time.perf_counter() - current._started
+        exporter.export(current.to_dict())
+        exporter.notify(
+            "span_end",
+            {
+                "span": name,
+                "duration_seconds": round(current.duration, 3),
+                "status": current.status,
+            },
+        )
+
+
+def add_event(name, **attributes):
+    """
+    Record a point-in-time event, e.g. a click attempt, on the current span
+    """
+    current = _current_span.get()
+    if current is not None:
+        current.events.append({"name": name, "time": time.time(), **attributes})
+    exporter = _exporter.get()
+    if exporter is not None:
+        exporter.notify(name, attributes)
+
+
+def progress(name, **attributes):
+    """
+    Report progress, e.g. recording time, to the listener only: frequent
+    updates would bloat the trace
+    """
+    exporter = _exporter.get()
+    if exporter is not None:
+        exporter.notify(name, attributes)
+
+
+def set_attributes(**attributes):
+    current = _current_span.get()
+    if current is not None:
+        current.attributes.update(attributes)
+
+
+def read_trace(path):
+    """
+    Spans of a trace file ordered by start time, or None if there is none
+    """
+    try:
+        with open(path) as f:
+            spans = [json.loads(line) for line in f if line.strip()]
+    except OSError:
+        return None
+    return sorted(spans, key=lambda s: s["start"])
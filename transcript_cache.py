@@ -0,0 +1,101 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+
+from metrics import TRANSCRIPT_CACHE_BYTES, TRANSCRIPT_CACHE_REQUESTS
+
+# Finished Gladia results, one file per uploaded audio and options
+TRANSCRIPT_CACHE = os.getenv("TRANSCRIPT_CACHE", "true").lower() in ("true", "1", "yes")
+TRANSCRIPT_CACHE_DIR = os.getenv("TRANSCRIPT_CACHE_DIR", "transcript_cache")
+# Least recently used results are evicted above this size
+TRANSCRIPT_CACHE_MAX_MB = float(os.getenv("TRANSCRIPT_CACHE_MAX_MB", 200))
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def _file_digest(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def cache_key(file_path, **options):
+    """
+    Key of the transcription of a file with the given options, hashed
+    chunk by chunk in a thread so large recordings are never held in memory
+    """
+    file_digest = await asyncio.to_thread(_file_digest, file_path)
+    options_json = json.dumps(options, sort_keys=True)
+    return hashlib.sha256(f"{file_digest}:{options_json}".encode()).hexdigest()
+
+
+def cache_path(key):
+    return os.path.join(TRANSCRIPT_CACHE_DIR, f"{key}.json")
+
+
+def load_result(key):
+    """
+    Cached Gladia result of the key, or None
+    """
+    path = cache_path(key)
+    try:
+        with open(path) as f:
+            result = json.load(f)
+        # the modification time orders the entries for eviction
+        os.utime(path)
+    except (OSError, ValueError):
+        TRANSCRIPT_CACHE_REQUESTS.labels("miss").inc()
+        return None
+    TRANSCRIPT_CACHE_REQUESTS.labels("hit").inc()
+    return result
+
+
+def save_result(key, result):
+    """
+    Cache a finished Gladia result, then evict down to TRANSCRIPT_CACHE_MAX_MB
+    """
+    os.makedirs(TRANSCRIPT_CACHE_DIR, exist_ok=True)
+    # written atomically, several workers can share the cache directory
+    fd, tmp_path = tempfile.mkstemp(dir=TRANSCRIPT_CACHE_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(result, f)
+    os.replace(tmp_path, cache_path(key))
+    evict()
+
+
+def evict(max_bytes=None):
+    """
+    Delete the least recently used results until the cache fits max_bytes
+    """
+    max_bytes = TRANSCRIPT_CACHE_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+    entries = []
+    try:
+        names = os.listdir(TRANSCRIPT_CACHE_DIR)
+    except OSError:
+        return
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        try:
+            stat = os.stat(os.path.join(TRANSCRIPT_CACHE_DIR, name))
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, name))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(TRANSCRIPT_CACHE_DIR, name))
+        except OSError:
+            continue
+        total -= size
+    TRANSCRIPT_CACHE_BYTES.set(total)
@@ -0,0 +1,115 @@
+import json
+import os
+
+TRANSCRIPT_FILE = "transcript.json"
+# Files written next to transcript.json
+SRT_FILE = "transcript.srt"
+VTT_FILE = "transcript.vtt"
+UTTERANCES_FILE = "utterances.ndjson"
+
+
+def utterances_of(response):
+    """
+    Utterances of a Gladia result as flat dicts, without their words
+    """
+    result = response.get("result") or {}
+    transcription = result.get("transcription") or {}
+    utterances = []
+    for utterance in transcription.get("utterances") or []:
+        text = (utterance.get("text") or "").strip()
+        if not text:
+            continue
+        utterances.append(
+            {
+                "start": utterance.get("start") or 0,
+                "end": utterance.get("end") or 0,
+                "speaker": utterance.get("speaker"),
+                "language": utterance.get("language"),
+                "text": text,
+            }
+        )
+    return utterances
+
+
+def _timestamp(seconds, separator):
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600 * 1000)
+    minutes, milliseconds = divmod(milliseconds, 60 * 1000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{milliseconds:03d}"
+
+
+def _speaker_label(utterance):
+    speaker = utterance["speaker"]
+    return None if speaker is None else f"Speaker {speaker}"
+
+
+def to_srt(utterances):
+    cues = []
+    for number, utterance in enumerate(utterances, 1):
+        label = _speaker_label(utterance)
+        text = f"{label}: {utterance['text']}" if label else utterance["text"]
+        cues.append(
+            f"{number}\n"
+            f"{_timestamp(utterance['start'], ',')} --> {_timestamp(utterance['end'], ',')}\n"
+            f"{text}\n"
+        )
+    return "\n".join(cues)
+
+
+def to_vtt(utterances):
+    cues = ["WEBVTT\n"]
+    for utterance in utterances:
+        label = _speaker_label(utterance)
+        text = f"<v {label}>{utterance['text']}" if label else utterance["text"]
+        cues.append(
+            f"{_timestamp(utterance['start'], '.')} --> {_timestamp(utterance['end'], '.')}\n"
+            f"{text}\n"
+        )
+    return "\n".join(cues)
+
+
+def to_ndjson(utterances):
+    return "".join(
+        json.dumps(utterance, ensure_ascii=False, separators=(",", ":")) + "\n"
+        for utterance in utterances
+    )
+
+
+def write_transcript_formats(output_dir, response):
+    """
+    Write the SRT, WebVTT and NDJSON versions of a finished transcription
+    and return its utterances
+    """
+    utterances = utterances_of(response)
+    for name, render in (
+        (SRT_FILE, to_srt),
+        (VTT_FILE, to_vtt),
+        (UTTERANCES_FILE, to_ndjson),
+    ):
+        with open(os.path.join(output_dir, name), "w", encoding="utf-8") as f:
+            f.write(render(utterances))
+    return utterances
+
+
+def read_utterances(output_dir):
+    """
+    Utterances saved by write_transcript_formats, or None
+    """
+    try:
+        with open(os.path.join(output_dir, UTTERANCES_FILE), encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except (OSError, ValueError):
+        return None
+
+
+def remove_transcript_files(output_dir):
+    """
+    Delete transcript.json, its converted versions and their gzip copies
+    """
+    for name in (TRANSCRIPT_FILE, SRT_FILE, VTT_FILE, UTTERANCES_FILE):
+        for path in (os.path.join(output_dir, name), os.path.join(output_dir, name + ".gz")):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,165 @@
+import os
+import sqlite3
+import threading
+
+from job_store import JOB_DB_BUSY_TIMEOUT
+
+TRANSCRIPT_INDEX_PATH = os.getenv(
+    "TRANSCRIPT_INDEX_PATH", os.path.join("recordings", "transcripts.db")
+)
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 200
+
+# Utterances of every transcribed job, and a full-text index over their text.
+# The FTS5 table only stores the index (content=utterances); triggers keep
+# it in step with the utterances table.
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS utterances (
+        id INTEGER PRIMARY KEY,
+        job_id TEXT NOT NULL,
+        start REAL NOT NULL,
+        end REAL NOT NULL,
+        speaker TEXT,
+        language TEXT,
+        text TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS utterances_job_id ON utterances (job_id)",
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS utterances_fts USING fts5(
+        text,
+        content='utterances',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS utterances_insert AFTER INSERT ON utterances BEGIN
+        INSERT INTO utterances_fts (rowid, text) VALUES (NEW.id, NEW.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS utterances_delete AFTER DELETE ON utterances BEGIN
+        INSERT INTO utterances_fts (utterances_fts, rowid, text)
+        VALUES ('delete', OLD.id, OLD.text);
+    END
+    """,
+)
+
+
+def quote_query(query):
+    """
+    FTS5 query matching every word of query, for text that is not valid
+    FTS5 syntax
+    """
+    return " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
+
+
+class TranscriptIndex:
+    """
+    Full-text search over the utterances of all transcribed jobs, in SQLite
+    FTS5 shared by every worker like the job store
+    """
+
+    def __init__(self, path=TRANSCRIPT_INDEX_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            path,
+            timeout=JOB_DB_BUSY_TIMEOUT,
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA:
+            self._db.execute(statement)
+
+    def _execute(self, query, params=()):
+        with self._lock:
+            return self._db.execute(query, params).fetchall()
+
+    def add(self, job_id, utterances):
+        """
+        Index the utterances of a job, replacing those indexed before
+        """
+        rows = [
+            (
+                job_id,
+                utterance["start"],
+                utterance["end"],
+                None if utterance.get("speaker") is None else str(utterance["speaker"]),
+                utterance.get("language"),
+                utterance["text"],
+            )
+            for utterance in utterances
+        ]
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("DELETE FROM utterances WHERE job_id = ?", (job_id,))
+                self._db.executemany(
+                    "INSERT INTO utterances (job_id, start, end, speaker, language, text) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def remove(self, job_id):
+        self._execute("DELETE FROM utterances WHERE job_id = ?", (job_id,))
+
+    def job_ids(self):
+        rows = self._execute("SELECT DISTINCT job_id FROM utterances")
+        return {row["job_id"] for row in rows}
+
+    def search(self, query, job_id=None, speaker=None, limit=SEARCH_PAGE_SIZE):
+        """
+        Best matching utterances first, with the matched words in [brackets].
+
+        query uses the FTS5 syntax (words, "phrases", prefix*, OR, NOT);
+        text that is not valid syntax is searched as plain words.
+        """
+        conditions = ["utterances_fts MATCH ?"]
+        params = []
+        if job_id:
+            conditions.append("u.job_id = ?")
+            params.append(job_id)
+        if speaker is not None:
+            conditions.append("u.speaker = ?")
+            params.append(str(speaker))
+        sql = (
+            "SELECT u.job_id, u.start, u.end, u.speaker, u.language, u.text, "
+            "snippet(utterances_fts, 0, '[', ']', '…', 16) AS snippet, "
+            "bm25(utterances_fts) AS score "
+            "FROM utterances_fts JOIN utterances u ON u.id = utterances_fts.rowid "
+            f"WHERE {' AND '.join(conditions)} "
+            "ORDER BY score LIMIT ?"
+        )
+        try:
+            rows = self._execute(sql, [query, *params, limit])
+        except sqlite3.OperationalError:
+            rows = self._execute(sql, [quote_query(query), *params, limit])
+        return [
+            {
+                "job_id": row["job_id"],
+                "start": row["start"],
+                "end": row["end"],
+                "speaker": row["speaker"],
+                "language": row["language"],
+                "text": row["text"],
+                "snippet": row["snippet"],
+                "score": round(-row["score"], 3),
+            }
+            for row in rows
+        ]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,76 @@
+import asyncio
+
+from selenium.common.exceptions import WebDriverException
+
+from tracing import add_event
+
+# How often a condition is re-evaluated while waiting
+POLL_INTERVAL = 0.25
+
+
+class StepTimeout(Exception):
+    """
+    A required step of the join flow did not complete in time
+    """
+
+
+async def wait_for(condition, timeout, description=None, required=False):
+    """
+    Re-evaluate condition() until it returns a truthy value or timeout expires.
+
+    WebDriver errors raised by the condition (missing or stale elements) count
+    as "not ready yet". Returns the condition's value, or None on timeout
+    unless required is set, in which case StepTimeout is raised.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + timeout
+    misses = 0
+
+    while True:
+        try:
+            result = condition()
+        except WebDriverException:
+            result = None
+        if result:
+            add_event(
+                "wait", target=description, seconds=loop.time() - started, misses=misses
+            )
+            return result
+        misses += 1
+        if loop.time() >= deadline:
+            add_event("wait_timeout", target=description, seconds=timeout, misses=misses)
+            if required:
+                raise StepTimeout(
+                    f"Timed out after {timeout}s waiting for {description or condition}"
+                )
+            return None
+        await asyncio.sleep(POLL_INTERVAL)
+
+
+def visible(driver, by, value):
+    """
+    First displayed element matching the locator, or None
+    """
+    for element in driver.find_elements(by, value):
+        if element.is_displayed():
+            return element
+    return None
+
+
+def clickable(driver, by, value):
+    """
+    First displayed and enabled element matching the locator, or None
+    """
+    element = visible(driver, by, value)
+    if element is not None and element.is_enabled():
+        return element
+    return None
+
+
+def absent(driver, by, value):
+    return visible(driver, by, value) is None
+
+
+def attribute_changed(element, name, previous):
+    return element.get_attribute(name) != previous